@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class SoundDeviceBackend:
+    """PortAudio devices through sounddevice (imported on first use)."""
+
+    def __init__(self):
+        import sounddevice as sd
+        self.sd = sd
+
+    def default_samplerate(self, device=None, kind='input'):
+        return self.sd.query_devices(device, kind)['default_samplerate']
+
+    def supports_samplerate(self, samplerate, device=None, kind='input'):
+        check = self.sd.check_input_settings if kind == 'input' else self.sd.check_output_settings
+        try:
+            check(device=device, samplerate=samplerate, dtype=np.float32)
+        except self.sd.PortAudioError:
+            return False
+        return True
+
+    def open_stream(self, samplerate, blocksize, channels, callback, device=(None, None), latency='high'):
+        return self.sd.Stream(
+            channels=channels,
+            samplerate=samplerate,
+            blocksize=blocksize,
+            dtype=np.float32,
+            callback=callback,
+            device=device,
+            latency=latency
+        )
+
+
+class VirtualAudioDevice:
+    """
+    Clock-driven stand-in for a duplex audio device. Feeds `source` into the
+    stream callback block by block (silence once it runs out, or from the
+    start again with `loop` until the stream is stopped) and records
+    everything the callback writes unless `capture` is off. `speed` > 1
+    runs the clock faster than real time; `speed=None` doesn't wait for the
+    clock but calls `pace()` after every callback, which should block until
+    the consumer has caught up (RealtimeVoiceConverter.wait_processed), or
+    input would outrun the conversions.
+    """
+    def __init__(self, source, samplerate, speed=1.0, tail=1.0, loop=False, capture=True, pace=None):
+        self.source = np.asarray(source, dtype=np.float32).reshape(-1)
+        self.samplerate = samplerate
+        self.speed = speed
+        self.pace = pace
+        self.tail = tail
+        self.loop = loop
+        self.capture = capture
+        self.captured = []
+        # Bounded so long (looped) runs don't grow
+        self.callback_times = deque(maxlen=100000)
+        self.late_callbacks = 0
+        self.finished = threading.Event()
+
+    def default_samplerate(self, device=None, kind='input'):
+        return self.samplerate
+
+    def supports_samplerate(self, samplerate, device=None, kind='input'):
+        return True
+
+    def open_stream(self, samplerate, blocksize, channels, callback, device=(None, None), latency='high'):
+        return VirtualStream(self, samplerate, blocksize or 256, channels, callback)
+
+    def output(self):
+        return np.concatenate(self.captured) if self.captured else np.zeros(0, dtype=np.float32)
+
+
+class VirtualStream:
+    def __init__(self, device, samplerate, blocksize, channels, callback):
+        self.device = device
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.callback = callback
+        self.active = False
+        self.thread = None
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self._run, name='virtual-audio', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.active = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        device = self.device
+        block = self.blocksize
+        total = len(device.source) + int(device.tail * self.samplerate)
+        period = block / self.samplerate
+        start_time = time.perf_counter()
+
+        position = 0
+        index = 0
+        while self.active and (device.loop or position < total):
+            indata = np.zeros((block, self.channels), dtype=np.float32)
+            if device.loop:
+                indata[:, 0] = np.take(device.source, np.arange(position, position + block), mode='wrap')
+            else:
+                chunk = device.source[position:position + block]
+                indata[:len(chunk), 0] = chunk
+            outdata = np.zeros((block, self.channels), dtype=np.float32)
+
+            now = index * period
+            time_info = SimpleNamespace(inputBufferAdcTime=now, outputBufferDacTime=now + period, currentTime=now)
+            callback_start = time.perf_counter()
+            self.callback(indata, outdata, block, time_info, None)
+            elapsed = time.perf_counter() - callback_start
+            device.callback_times.append(elapsed)
+            if elapsed > period:
+                device.late_callbacks += 1
+
+            if device.capture:
+                device.captured.append(outdata[:, 0].copy())
+            position += block
+            index += 1
+
+            if device.speed:
+                delay = start_time + index * period / device.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif device.pace is not None:
+                device.pace()
+
+        self.active = False
+        device.finished.set()
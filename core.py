@@ -1,175 +1,867 @@
 import warnings
 warnings.filterwarnings('ignore')
 
-import sounddevice as sd
 import queue
 import threading
 import numpy as np
 import time
-from vc import ToneColorConverter
+from collections import deque
+from vc import ToneColorConverter, QUALITY_TIERS
+from vc.resample import StreamResampler, RevisableResampler
+from vc.library import blend_se
+from vc.latent_cache import LatentCache
+from vc.trace import span, tracer
+from jitter import JitterBuffer
+from backends import SoundDeviceBackend
+from memory import MemoryGauge
+from reblock import Reblocker
 
-class RealtimeVoiceConverter:
-    def __init__(self, model_path, target_voice_path, device='cpu', input_device=None, output_device=None):
-        self.CHUNK = 9984
-        self.RATE = 22050
-        self.CHANNELS = 1
+class QualityController:
+    """
+    Steps the converter down a quality tier when conversions keep eating most
+    of the real-time budget of a step (or input keeps piling up past
+    `max_backlog` steps) for `overload_chunks` steps in a row, and back up
+    after a run of steps with comfortable headroom. A single slow step (GC
+    pause, scheduler hiccup) doesn't count; dropped input does, right away.
+    """
+    def __init__(self, chunk_duration, n_tiers=len(QUALITY_TIERS), high_load=0.8, low_load=0.45, recover_chunks=10, overload_chunks=3, max_backlog=1):
+        self.chunk_duration = chunk_duration
+        self.n_tiers = n_tiers
+        self.high_load = high_load
+        self.low_load = low_load
+        self.recover_chunks = recover_chunks
+        self.overload_chunks = overload_chunks
+        self.max_backlog = max_backlog
+
+        self.tier = 0
+        self.load = 0.0
+        self.calm_count = 0
+        self.overload_count = 0
+
+    def update(self, process_time, backlog=0, dropped=False):
+        self.load = process_time / self.chunk_duration
+
+        if self.load > self.high_load or backlog > self.max_backlog or dropped:
+            self.calm_count = 0
+            self.overload_count += 1
+            if (dropped or self.overload_count >= self.overload_chunks) and self.tier < self.n_tiers - 1:
+                self.tier += 1
+                self.overload_count = 0
+        elif self.load < self.low_load:
+            self.overload_count = 0
+            self.calm_count += 1
+            if self.calm_count >= self.recover_chunks and self.tier > 0:
+                self.tier -= 1
+                self.calm_count = 0
+        else:
+            self.calm_count = 0
+            self.overload_count = 0
+        return self.tier
+
+
+class ChunkProcessor:
+    """
+    Windowed conversion shared by every front end: CHUNK-sized pieces at the
+    model rate go in, each step converts a window of three chunks and emits
+    the middle one, crossfaded against the previous output. `hop`,
+    `speculative` and `align_splices` select the other emission modes (see
+    the _process_* methods and _splice_offset); `target_se` may stack several
+    voices ([N, 256, 1]), making every output [N, samples]; `cache_margin`
+    reuses source latents across windows (LatentCache).
+    """
+    def __init__(
+        self,
+        converter,
+        target_se,
+        chunk=9984,
+        speech_threshold=0.015,
+        adaptive_quality=False,
+        hop=None,
+        lookahead=None,
+        speculative=False,
+        cache_margin=None,
+        validate_cache=False,
+        align_splices=False,
+        splice_lag=None,
+    ):
+        self.converter = converter
+        self.target_se = target_se
+        # The stack this step converts for; see _take_target()
+        self.step_target_se = target_se
+        self.CHUNK = chunk
+        self.RATE = converter.sampling_rate
         self.CROSSFADE_SIZE = int(self.RATE * 0.005)
-        self.SPEECH_THRESHOLD = 0.015
+        self.SPEECH_THRESHOLD = speech_threshold
 
         self.SILENCE_CHUNK = np.zeros(self.CHUNK, dtype=np.float32)
-        
-        self.input_device = input_device
-        self.output_device = output_device
-        
-        self.converter = ToneColorConverter(ckpt_path=model_path, device=device)
-        tgt_spec = self.converter.get_spec(fpath=target_voice_path)
-        self.target_se = self.converter.model.extract_se(tgt_spec)
-        
+
         self.chunk_buffer = []
         self.chunk_speech_status = []
-        self.input_queue = queue.Queue(maxsize=4)
-        self.output_queue = queue.Queue(maxsize=4)
-        
         self.prev_chunk_end = None
         self.last_was_speech = False
-        
-        self.is_running = False
-        self.drop_count = 0
+
+        self.SPLICE_LAG = None
+        self.prev_continuation = None
+        if align_splices:
+            if hop is not None or speculative:
+                raise ValueError("splice alignment works in whole-chunk mode only")
+            self.SPLICE_LAG = splice_lag if splice_lag is not None else int(self.RATE * 0.006)
+            if not 0 < self.SPLICE_LAG <= chunk - self.CROSSFADE_SIZE:
+                raise ValueError(f"splice lag {self.SPLICE_LAG} doesn't fit a {chunk} sample chunk")
+
+        self.speculative = speculative
+        self.revision = None
+        self.has_emitted = False
+        if speculative:
+            if hop is not None:
+                raise ValueError("speculative emission works on whole chunks, not with a hop")
+            self.LOOKAHEAD = lookahead if lookahead is not None else chunk // 8
+            if not 0 < self.LOOKAHEAD < chunk:
+                raise ValueError(f"lookahead {self.LOOKAHEAD} must be shorter than the {chunk} sample chunk")
+
+        self.HOP = hop
+        if hop is not None:
+            self.WINDOW = 3 * chunk
+            self.LOOKAHEAD = lookahead if lookahead is not None else chunk // 2
+            if 2 * hop + self.LOOKAHEAD > self.WINDOW:
+                raise ValueError(f"hop {hop} with lookahead {self.LOOKAHEAD} doesn't fit a {self.WINDOW} sample window")
+            self.window = np.zeros(self.WINDOW, dtype=np.float32)
+            self.prev_frame_tail = np.zeros(hop, dtype=np.float32)
+            # sin²/cos² sum to one: overlapping frames are converted from the
+            # same input and nearly identical, so sin/cos (constant power)
+            # would swell them by up to 3dB at every hop
+            fade_pos = np.linspace(0, np.pi / 2, hop, dtype=np.float32)
+            self.ola_fade_in = np.sin(fade_pos) ** 2
+            self.ola_fade_out = np.cos(fade_pos) ** 2
+
+        # Input samples fed so far; lines cached latents up with the window
+        # (hops that aren't whole spectrogram frames get no reuse)
+        self.position = 0
+        self.latent_cache = None
+        if cache_margin is not None:
+            self.latent_cache = LatentCache(converter.model, converter.hps['data']['hop_length'], cache_margin, validate=validate_cache)
+
         self.total_latency = 0
         self.process_count = 0
-    
+        self.process_times = deque(maxlen=1000)
+
+        step = hop if hop is not None else self.CHUNK
+        # Backlog is counted in steps: more than a chunk of waiting input is too much
+        self.quality_controller = QualityController(step / self.RATE, max_backlog=max(1, self.CHUNK // step)) if adaptive_quality else None
+
+    @property
+    def n_targets(self):
+        return len(self.step_target_se)
+
+    def _take_target(self):
+        # Read the target once per step so a concurrent swap applies between
+        # steps. A different number of stacked targets changes the shape of
+        # everything carried over for crossfades, so that starts afresh
+        target_se = self.target_se
+        if len(target_se) != len(self.step_target_se):
+            self.prev_chunk_end = None
+            self.prev_continuation = None
+            self.revision = None
+            if self.HOP is not None:
+                self.prev_frame_tail = np.zeros(self.HOP, dtype=np.float32)
+        self.step_target_se = target_se
+
+    def _silence(self, n):
+        shape = (n,) if self.n_targets == 1 else (self.n_targets, n)
+        return np.zeros(shape, dtype=np.float32)
+
     def is_speech(self, audio_chunk):
         energy = np.mean(np.abs(audio_chunk))
         return energy > self.SPEECH_THRESHOLD
     
-    def apply_short_crossfade(self, chunk):
+    def apply_short_crossfade(self, chunk, continuation=None):
+        # `continuation`: what the chunk's own conversion goes on with past
+        # its end. The next chunk then fades in from that instead of from a
+        # replay of this chunk's last samples
         if self.prev_chunk_end is None:
-            self.prev_chunk_end = chunk[-self.CROSSFADE_SIZE:]
+            self.prev_chunk_end = chunk[..., -self.CROSSFADE_SIZE:] if continuation is None else continuation
             return chunk
             
         fade_in = np.sin(np.linspace(0, np.pi/2, self.CROSSFADE_SIZE))**2
         fade_out = np.cos(np.linspace(0, np.pi/2, self.CROSSFADE_SIZE))**2
         
-        chunk_start = chunk[:self.CROSSFADE_SIZE]
+        chunk_start = chunk[..., :self.CROSSFADE_SIZE]
         crossfaded = (self.prev_chunk_end * fade_out + chunk_start * fade_in)
-        chunk[:self.CROSSFADE_SIZE] = crossfaded
+        chunk[..., :self.CROSSFADE_SIZE] = crossfaded
         
-        self.prev_chunk_end = chunk[-self.CROSSFADE_SIZE:]
+        self.prev_chunk_end = chunk[..., -self.CROSSFADE_SIZE:] if continuation is None else continuation
         return chunk
 
+    def _splice_offset(self, converted, start):
+        # Offset from `start`, within ±SPLICE_LAG (6ms by default), where the
+        # head of `converted` best matches (normalized cross-correlation) what
+        # the previous conversion continued with past the previous chunk; the
+        # crossfade then runs from that continuation into the chunk, in phase.
+        # Chosen afresh against the nominal position every chunk, so output
+        # timing wanders by at most SPLICE_LAG and never drifts. All candidate
+        # heads at once as a strided [2 * lag + 1, CROSSFADE_SIZE] view
+        template = self.prev_continuation
+        if template is None:
+            return 0
+        lag, n = self.SPLICE_LAG, self.CROSSFADE_SIZE
+        template_energy = np.sum(template * template)
+        if template_energy < 1e-8:
+            return 0
+        candidates = np.lib.stride_tricks.sliding_window_view(converted[..., start - lag:start + lag + n], n, axis=-1)
+        dots = np.einsum('...kn,...n->...k', candidates, template)
+        energy = np.einsum('...kn,...kn->...k', candidates, candidates)
+        if dots.ndim > 1:
+            # Stacked targets share one offset so the voices stay in step
+            dots, energy = dots.sum(0), energy.sum(0)
+        return int(np.argmax(dots / np.sqrt(energy * template_energy + 1e-12))) - lag
+
+    def _convert(self, audio):
+        with span('get_spec'):
+            src_spec = self.converter.get_spec(wav=audio)
+        target_se = self.step_target_se
+        with span('convert'):
+            source = self.latent_cache.encode(src_spec, self.position) if self.latent_cache is not None else None
+            if len(target_se) > 1:
+                converted = self.converter.convert_multi(src_spec, target_se, source=source)[0]
+            else:
+                converted = self.converter.convert(src_spec, target_se, source=source)[0]
+        converted = np.nan_to_num(converted)
+        return np.clip(converted, -1.0, 1.0)
+
+    def _finish_step(self, start_time, converted, backlog, dropped):
+        process_time = time.time() - start_time
+        self.total_latency += process_time
+        self.process_count += 1
+        self.process_times.append(process_time)
+
+        if self.quality_controller is not None and converted:
+            tier = self.quality_controller.update(process_time, backlog, dropped)
+            if tier != self.converter.quality:
+                self.converter.set_quality(tier)
+
+    def process(self, audio_chunk, backlog=0, dropped=False):
+        """
+        Feeds one input chunk (one hop in overlap-add mode). Returns the next
+        output chunk, or None while the window is still filling up. `backlog`
+        and `dropped` describe the caller's input queue and drive the quality
+        controller.
+        """
+        self.position += audio_chunk.shape[-1]
+        self._take_target()
+        if self.HOP is not None:
+            return self._process_overlap_add(audio_chunk, backlog, dropped)
+
+        is_current_speech = self.is_speech(audio_chunk)
+        
+        self.chunk_buffer.append(audio_chunk)
+        self.chunk_speech_status.append(is_current_speech)
+
+        if len(self.chunk_buffer) < 3:
+            return None
+        if self.speculative:
+            return self._process_speculative(backlog, dropped)
+
+        start_time = time.time()
+        middle_chunk_speech = self.chunk_speech_status[1]
+        force_convert = self.last_was_speech and not middle_chunk_speech
+
+        if middle_chunk_speech or force_convert:
+            # Convert speech chunks
+            converted = self._convert(np.concatenate(self.chunk_buffer))
+            
+            chunk_length = converted.shape[-1] // 3
+            offset = self._splice_offset(converted, chunk_length) if self.SPLICE_LAG else 0
+            middle_chunk = converted[..., chunk_length + offset:2*chunk_length + offset]
+            continuation = None
+            if self.SPLICE_LAG:
+                continuation = converted[..., 2*chunk_length + offset:2*chunk_length + offset + self.CROSSFADE_SIZE].copy()
+        else:
+            # Generate silence for non-speech
+            middle_chunk = self._silence(self.CHUNK)
+            continuation = None
+        
+        middle_chunk = self.apply_short_crossfade(middle_chunk, continuation)
+        self.prev_continuation = continuation
+        
+        self.last_was_speech = middle_chunk_speech
+        self.chunk_buffer.pop(0)
+        self.chunk_speech_status.pop(0)
+        
+        self._finish_step(start_time, middle_chunk_speech or force_convert, backlog, dropped)
+        return middle_chunk
+
+    def _process_speculative(self, backlog, dropped):
+        # Emits the chunk ending LOOKAHEAD samples before the newest input
+        # instead of the middle one, so output is a chunk minus LOOKAHEAD
+        # earlier. The same conversion covers the previously emitted chunk
+        # with a full chunk more lookahead; that corrected version is left in
+        # `revision` for the caller to swap in for whatever hasn't been
+        # played yet (JitterBuffer.revise)
+        start_time = time.time()
+        lookahead = self.LOOKAHEAD
+        # The emitted chunk lies mostly in the newest input chunk, its revision
+        # mostly in the one before
+        speech = self.chunk_speech_status[1] or self.chunk_speech_status[2]
+        force_convert = self.last_was_speech and not speech
+
+        self.revision = None
+        if speech or force_convert:
+            converted = self._convert(np.concatenate(self.chunk_buffer))
+            chunk_length = converted.shape[-1] // 3
+            output = converted[..., 2 * chunk_length - lookahead:3 * chunk_length - lookahead].copy()
+            if self.has_emitted:
+                # The final version of the previous chunk is the one that
+                # crossfades against the chunk before it; `output` continues
+                # it seamlessly, coming from the same conversion
+                self.revision = self.apply_short_crossfade(converted[..., chunk_length - lookahead:2 * chunk_length - lookahead].copy())
+        else:
+            output = self._silence(self.CHUNK)
+            self.prev_chunk_end = output[..., -self.CROSSFADE_SIZE:]
+
+        self.has_emitted = True
+        self.last_was_speech = speech
+        self.chunk_buffer.pop(0)
+        self.chunk_speech_status.pop(0)
+
+        self._finish_step(start_time, speech or force_convert, backlog, dropped)
+        return output
+
+    def _process_overlap_add(self, hop_samples, backlog, dropped):
+        # Converts the latest WINDOW (three chunks) of input every hop and
+        # emits HOP samples ending LOOKAHEAD + HOP before the newest input.
+        # Consecutive frames overlap by HOP and are blended, so latency
+        # scales with the hop instead of the chunk, at one conversion per hop
+        hop = self.HOP
+        window = self.window
+        window[:-hop] = window[hop:]
+        window[-hop:] = hop_samples
+
+        start_time = time.time()
+        frame_end = self.WINDOW - self.LOOKAHEAD
+        frame_start = frame_end - 2 * hop
+        frame_speech = self.is_speech(window[frame_start:frame_end])
+        force_convert = self.last_was_speech and not frame_speech
+
+        if frame_speech or force_convert:
+            frame = self._convert(window)[..., frame_start:frame_end]
+        else:
+            frame = self._silence(2 * hop)
+
+        # The first half completes the previous frame's tail, the second half
+        # waits for the next frame
+        output = self.prev_frame_tail * self.ola_fade_out + frame[..., :hop] * self.ola_fade_in
+        self.prev_frame_tail = frame[..., hop:].copy()
+        self.last_was_speech = frame_speech
+
+        self._finish_step(start_time, frame_speech or force_convert, backlog, dropped)
+        return output.astype(np.float32)
+
+    def reset(self, context=None):
+        """
+        Forgets the window, e.g. after an idle period. `context` (the most
+        recent input, as one array) seeds the window without emitting
+        anything, so the next piece is converted with real left context.
+        """
+        self.chunk_buffer = []
+        self.chunk_speech_status = []
+        self.prev_chunk_end = None
+        self.last_was_speech = False
+        self.revision = None
+        self.has_emitted = False
+        self.prev_continuation = None
+        if self.latent_cache is not None:
+            self.latent_cache.reset()
+        if self.HOP is not None:
+            self.window[:] = 0
+            self.prev_frame_tail[:] = 0
+            if context is not None:
+                context = context[-(self.WINDOW - self.HOP):]
+                self.window[self.WINDOW - len(context):] = context
+        elif context is not None:
+            # A speculative window emits as soon as its newest chunk arrives,
+            # so it takes one more chunk of context
+            n_chunks = min(len(context) // self.CHUNK, 2 if self.speculative else 1)
+            for i in range(n_chunks, 0, -1):
+                chunk = context[len(context) - i * self.CHUNK:len(context) - (i - 1) * self.CHUNK]
+                self.chunk_buffer.append(chunk)
+                self.chunk_speech_status.append(self.is_speech(chunk))
+
+    @property
+    def context_size(self):
+        # Input samples reset() can make use of
+        if self.HOP is not None:
+            return self.WINDOW - self.HOP
+        return 2 * self.CHUNK if self.speculative else self.CHUNK
+
+    @property
+    def buffer_size(self):
+        return len(self.chunk_buffer)
+
+    @property
+    def quality(self):
+        return self.converter.quality
+
+
+class RealtimeVoiceConverter:
+    def __init__(
+        self,
+        model_path,
+        target_voice_path=None,
+        device='cpu',
+        input_device=None,
+        output_device=None,
+        adaptive_quality=True,
+        converter=None,
+        samplerate=None,
+        target_se=None,
+        target_latency=0.1,
+        backend=None,
+        isolate=False,
+        record_path=None,
+        trace_path=None,
+        idle_after=2.0,
+        output_path=None,
+        hop=None,
+        speculative=False,
+        lookahead=None,
+        stream_sink=None,
+        cache_margin=None,
+        validate_cache=False,
+        align_splices=False,
+        blocksize=0,
+        stream_latency='low',
+    ):
+        self.CHUNK = 9984
+        self.RATE = 22050
+        self.CHANNELS = 1
+        # Input is handed over in STEP pieces: whole chunks, or hops in
+        # overlap-add mode (see ChunkProcessor)
+        self.STEP = hop if hop is not None else self.CHUNK
+
+        # PortAudio by default; a VirtualAudioDevice runs the same pipeline headless
+        self.backend = backend if backend is not None else SoundDeviceBackend()
+
+        # The stream runs at the devices' native rate; audio is resampled to and
+        # from the model's RATE around the conversion. A duplex stream has one
+        # rate for both sides, so when the defaults differ the output's wins
+        # and the input device has to capture at it
+        if samplerate is None:
+            input_rate = self.backend.default_samplerate(input_device, 'input')
+            samplerate = self.backend.default_samplerate(output_device, 'output')
+            if input_rate != samplerate and not self.backend.supports_samplerate(samplerate, input_device, 'input'):
+                raise ValueError(f"Input device runs at {input_rate:.0f} Hz and can't capture at the output device's {samplerate:.0f} Hz; choose devices with a common rate or pass samplerate")
+        self.DEVICE_RATE = int(samplerate)
+        self.DEVICE_CHUNK = round(self.STEP * self.DEVICE_RATE / self.RATE)
+        
+        self.input_device = input_device
+        self.output_device = output_device
+        
+        # A preloaded (and warmed up) converter can be shared to skip model loading
+        if converter is None and (target_se is None or not isolate):
+            converter = ToneColorConverter(ckpt_path=model_path, device=device)
+        if target_se is None:
+            target_se = converter.extract_target_se(target_voice_path)
+
+        # Opt-in timeline of the callback, processor and model stages, written
+        # as Chrome trace JSON on stop()
+        self.trace_path = trace_path
+        if trace_path is not None:
+            tracer.enable()
+
+        # Speculative mode emits a chunk minus `lookahead` earlier (see ChunkProcessor)
+        if speculative and lookahead is None:
+            lookahead = self.CHUNK // 8
+
+        # Several stacked targets are converted together; `monitor` picks the
+        # one that is played and `stream_sink(streams)` gets all of them
+        # ([N, samples] at the model rate) every step
+        self.monitor = 0
+        self.last_monitor = 0
+        self.stream_sink = stream_sink
+        if isolate and len(target_se) > 1:
+            raise ValueError("multi-target conversion runs in-process only")
+
+        self.isolate = isolate
+        if isolate:
+            # Inference in a child process with its own model and GIL; this
+            # process only keeps the audio callback and the jitter buffer
+            from worker import InferenceProcess
+            self.converter = None
+            self.processor = InferenceProcess(model_path, target_se, device=device, chunk=self.CHUNK, hop=hop, output_rate=self.DEVICE_RATE, adaptive_quality=adaptive_quality, trace=trace_path is not None,
+                                              speculative=speculative, lookahead=lookahead, cache_margin=cache_margin, align_splices=align_splices)
+        else:
+            self.converter = converter
+            self.converter.set_quality(0)
+            self.processor = ChunkProcessor(self.converter, target_se, chunk=self.CHUNK, adaptive_quality=adaptive_quality, hop=hop,
+                                            speculative=speculative, lookahead=lookahead, cache_margin=cache_margin, validate_cache=validate_cache, align_splices=align_splices)
+        self.speculative = speculative
+        
+        # Up to four chunks' worth of input may wait for the processor
+        self.input_queue = queue.Queue(maxsize=max(4, 4 * self.CHUNK // self.STEP))
+        # Converted audio waits here at the device rate until the callback plays it
+        self.jitter_buffer = JitterBuffer(self.DEVICE_RATE, target_latency=target_latency)
+
+        if self.DEVICE_RATE != self.RATE:
+            self.input_resampler = StreamResampler(self.DEVICE_RATE, self.RATE)
+            self.output_resampler = (RevisableResampler if speculative else StreamResampler)(self.RATE, self.DEVICE_RATE)
+        else:
+            self.input_resampler = None
+            self.output_resampler = None
+        # The device runs at its own (small, possibly varying) block size;
+        # input is regrouped into STEP pieces here and output drained from the
+        # jitter buffer a callback's worth at a time. 0 lets the host pick
+        self.blocksize = blocksize
+        self.stream_latency = stream_latency
+        self.input_reblocker = Reblocker(self.STEP)
+        
+        self.is_running = False
+        self.drop_count = 0
+        self.last_drop_count = 0
+        # RSS, malloc heap and Python allocator numbers for get_stats()
+        self.memory_gauge = MemoryGauge()
+
+        # Idle mode: after `idle_after` seconds of silence the callback stops
+        # queueing chunks and only runs the energy VAD, the processor thread
+        # blocks on wake_event and torch gets no work, so its worker threads
+        # park. The latest input is kept as left context for the wake-up
+        # (as much as ChunkProcessor.reset() can use).
+        self.SPEECH_THRESHOLD = 0.015
+        self.idle_chunks = int(np.ceil(idle_after * self.RATE / self.STEP)) if idle_after else None
+        self.idle = False
+        self.silent_chunks = 0
+        if hop is not None:
+            context_size = 3 * self.CHUNK - self.STEP
+        else:
+            context_size = 2 * self.CHUNK if speculative else self.CHUNK
+        self.preroll = deque(maxlen=-(-context_size // self.STEP))
+        self.wake_event = threading.Event()
+        self.wake_event.set()
+        # Warming the model up takes about a conversion. Whole-chunk mode
+        # needs another chunk after waking before it converts, so the warmup
+        # starts at the first loud device block and is done by then; the
+        # other modes convert straight away and skip it
+        self.prewarm_on_onset = hop is None and not speculative
+        self.prewarm_requested = False
+        self.prewarm_pending = False
+        self.idle_count = 0
+        self.idle_skipped_chunks = 0
+
+        # Optional copy of the converted output on disk (see recording.py)
+        self.output_recorder = None
+        self.recorded_skipped_chunks = 0
+        self.unrecorded_output = None
+        if output_path is not None:
+            from recording import OutputRecorder
+            self.output_recorder = OutputRecorder(output_path, self.DEVICE_RATE)
+
+        # Opt-in session capture for replaying incidents (see session_log.py)
+        self.recorder = None
+        if record_path is not None:
+            from session_log import SessionRecorder
+            self.recorder = SessionRecorder(record_path, self.RATE, self.CHUNK, hop, lookahead if speculative else None)
+            self.recorder.record_target(target_se)
+
+    @property
+    def target_se(self):
+        return self.processor.target_se
+    
+    def set_target_se(self, target_se):
+        # Takes effect from the next chunk; a single attribute assignment is
+        # atomic, so this is safe to call from any thread while running
+        if len(target_se) > 1 and self.isolate:
+            raise ValueError("multi-target conversion runs in-process only")
+        self.processor.target_se = target_se if self.isolate else target_se.to(self.converter.device)
+        self.monitor = min(self.monitor, len(target_se) - 1)
+        if self.recorder is not None:
+            self.recorder.record_target(target_se)
+
+    def set_target_blend(self, se_a, se_b, alpha):
+        self.set_target_se(blend_se(se_a, se_b, alpha))
+
     def _process_audio(self):
         while self.is_running:
+            if self.idle and self.input_queue.empty():
+                if self.prewarm_pending:
+                    self.prewarm_pending = False
+                    self.wake_event.clear()
+                    self.converter.warmup(self.CHUNK)
+                    continue
+                # Nothing to do until the callback hears speech again
+                self.wake_event.wait()
+                continue
+            wait_start = time.time()
             try:
-                audio_chunk = self.input_queue.get(timeout=0.1)
-                is_current_speech = self.is_speech(audio_chunk)
-                
-                self.chunk_buffer.append(audio_chunk)
-                self.chunk_speech_status.append(is_current_speech)
-
-                if len(self.chunk_buffer) == 3:
-                    start_time = time.time()
-                    middle_chunk_speech = self.chunk_speech_status[1]
-                    force_convert = self.last_was_speech and not middle_chunk_speech
-
-                    if middle_chunk_speech or force_convert:
-                        # Convert speech chunks
-                        combined_audio = np.concatenate(self.chunk_buffer)
-                        src_spec = self.converter.get_spec(wav=combined_audio)
-                        converted = self.converter.convert(src_spec, self.target_se)[0]
-                        converted = np.nan_to_num(converted)
-                        converted = np.clip(converted, -1.0, 1.0)
-                        
-                        chunk_length = len(converted) // 3
-                        middle_chunk = converted[chunk_length:2*chunk_length]
-                    else:
-                        # Generate silence for non-speech
-                        middle_chunk = self.SILENCE_CHUNK
-                    
-                    middle_chunk = self.apply_short_crossfade(middle_chunk)
-                    self.output_queue.put(middle_chunk)
-                    
-                    self.last_was_speech = middle_chunk_speech
-                    self.chunk_buffer.pop(0)
-                    self.chunk_speech_status.pop(0)
-                    
-                    process_time = time.time() - start_time
-                    self.total_latency += process_time
-                    self.process_count += 1
-                
+                with span('queue_wait'):
+                    audio_chunk = self.input_queue.get(timeout=0.1)
             except queue.Empty:
                 continue
+            try:
+                self._process_chunk(audio_chunk, time.time() - wait_start)
             except Exception as e:
                 print(f"Error in processing: \"{e}\"")
+            finally:
+                # Done only once its output is written, so input_queue.join()
+                # can pace an unpaced virtual device to the conversions
+                self.input_queue.task_done()
+
+    def wait_processed(self):
+        # Blocks until every queued input chunk is converted and its output
+        # written, or the converter stops (an unpaced VirtualAudioDevice's pace)
+        with self.input_queue.all_tasks_done:
+            while self.input_queue.unfinished_tasks and self.is_running:
+                self.input_queue.all_tasks_done.wait(0.1)
+
+    def _process_chunk(self, audio_chunk, wait_time):
+        if isinstance(audio_chunk, tuple):
+            self._wake_processor(audio_chunk[1])
+            return
+
+        dropped = self.drop_count != self.last_drop_count
+        self.last_drop_count = self.drop_count
+        with span('process_chunk'):
+            middle_chunk = self.processor.process(audio_chunk, self.input_queue.qsize(), dropped)
+        if middle_chunk is None:
+            return
+        if self.recorder is not None:
+            self._record_step(wait_time, self.processor.process_times[-1])
+
+        with span('output_write'):
+            revision = self.processor.revision
+            if middle_chunk.ndim == 2:
+                middle_chunk, revision = self._select_stream(middle_chunk, revision)
+            if self.output_resampler is not None:
+                # The revision goes first: it rewinds the resampler to
+                # before the chunk it replaces
+                if revision is not None:
+                    revision = self.output_resampler.revise(revision)
+                middle_chunk = self.output_resampler.process(middle_chunk)
+            self._emit(middle_chunk * 0.8, revision * 0.8 if revision is not None else None)
+
+    def set_monitor(self, index):
+        # Which of the stacked targets is played; switches crossfade
+        n_targets = len(self.processor.target_se)
+        if not 0 <= index < n_targets:
+            raise ValueError(f"monitor {index} out of range for {n_targets} targets")
+        self.monitor = index
+
+    def _select_stream(self, streams, revision):
+        if self.stream_sink is not None:
+            self.stream_sink(streams)
+        # The stack may have shrunk since the monitor was picked
+        monitor = min(self.monitor, len(streams) - 1)
+        output = streams[monitor].copy()
+        if self.last_monitor >= len(streams):
+            self.last_monitor = monitor
+        if monitor != self.last_monitor:
+            # Both voices come from the same input, so they line up in time
+            n = self.processor.CROSSFADE_SIZE
+            fade = np.sin(np.linspace(0, np.pi / 2, n, dtype=np.float32)) ** 2
+            output[:n] = streams[self.last_monitor][:n] * (1 - fade) + output[:n] * fade
+            self.last_monitor = monitor
+        return output, revision[monitor] if revision is not None else None
+
+    def _emit(self, samples, revision=None):
+        # Converted audio at the device rate: to playback, and to disk if
+        # recording. `revision` corrects the previous call's samples
+        # (speculative mode); the file gets the final version, one step late.
+        if revision is not None:
+            self.jitter_buffer.revise(revision)
+        self.jitter_buffer.write(samples)
+        if self.output_recorder is None:
+            return
+        if self.speculative:
+            # The previous chunk came before any idle gap since
+            self._flush_unrecorded(revision)
+            self.unrecorded_output = samples
+        else:
+            self._record_idle_gap()
+            self.output_recorder.write(samples)
+
+    def _flush_unrecorded(self, revision=None):
+        samples = revision if revision is not None else self.unrecorded_output
+        if samples is not None:
+            self.output_recorder.write(samples)
+        self.unrecorded_output = None
+        self._record_idle_gap()
+
+    def _record_idle_gap(self):
+        skipped = self.idle_skipped_chunks
+        if skipped != self.recorded_skipped_chunks:
+            self.output_recorder.add_silence((skipped - self.recorded_skipped_chunks) * self.DEVICE_CHUNK)
+            self.recorded_skipped_chunks = skipped
+
+    def _push_input(self, samples):
+        # Resample device input to the model rate and hand it over in STEP pieces
+        if self.input_resampler is not None:
+            samples = self.input_resampler.process(samples)
+        if self.idle and self.prewarm_on_onset and not self.prewarm_requested and np.mean(np.abs(samples)) > self.SPEECH_THRESHOLD:
+            self._request_prewarm()
+
+        for chunk in self.input_reblocker.push(samples):
+            if self.idle_chunks is not None and not self._update_idle(chunk):
                 continue
+            if self.isolate:
+                if not self.processor.push(chunk):
+                    self.drop_count += 1
+                    continue
+            else:
+                try:
+                    self.input_queue.put_nowait(chunk)
+                except queue.Full:
+                    self.drop_count += 1
+                    continue
+            if self.recorder is not None:
+                self.recorder.record_input(chunk, self._backlog(), self.drop_count)
+
+    def _update_idle(self, chunk):
+        # Callback-side VAD; returns False when the chunk should not be queued
+        speech = np.mean(np.abs(chunk)) > self.SPEECH_THRESHOLD
+        if self.idle and speech:
+            self._wake()
+        elif not self.idle:
+            self.silent_chunks = 0 if speech else self.silent_chunks + 1
+            if self.silent_chunks >= self.idle_chunks:
+                self._enter_idle()
+
+        self.preroll.append(chunk)
+        if self.idle:
+            self.idle_skipped_chunks += 1
+            return False
+        return True
+
+    def _request_prewarm(self):
+        self.prewarm_requested = True
+        if self.isolate:
+            self.processor.prewarm()
+        else:
+            self.prewarm_pending = True
+            self.wake_event.set()
+
+    def _enter_idle(self):
+        self.idle = True
+        self.prewarm_requested = False
+        self.idle_count += 1
+        self.jitter_buffer.pause()
+        if self.isolate:
+            self.processor.set_idle(True)
+        else:
+            self.wake_event.clear()
+
+    def _wake(self):
+        # Restart the window seeded with the latest silent input, so the first
+        # speech chunk is converted exactly as without idling
+        self.idle = False
+        self.silent_chunks = 0
+        self.jitter_buffer.resume()
+        context = np.concatenate(self.preroll)
+        if self.recorder is not None:
+            self.recorder.record_wake(context)
+        if self.isolate:
+            self.processor.set_idle(False, context)
+        else:
+            try:
+                self.input_queue.put_nowait(('wake', context))
+            except queue.Full:
+                self.drop_count += 1
+            self.wake_event.set()
+
+    def _wake_processor(self, context):
+        # The warmup already ran at the onset (_request_prewarm), if at all:
+        # nothing may queue behind this
+        self.processor.reset(context)
+
+    def _backlog(self):
+        if self.isolate:
+            return self.processor.input_ring.fill // self.STEP
+        return self.input_queue.qsize()
+
+    def _record_step(self, wait_time, process_time):
+        processor = self.processor
+        self.recorder.record_step(wait_time, process_time, self._backlog(), processor.last_was_speech, processor.quality)
 
     def start(self):
         self.is_running = True
-        self.processor_thread = threading.Thread(target=self._process_audio)
-        self.processor_thread.start()
+        if self.isolate:
+            on_step = (lambda process_time: self._record_step(0.0, process_time)) if self.recorder is not None else None
+            self.processor.start(self._emit, on_step)
+        else:
+            self.processor_thread = threading.Thread(target=self._process_audio, name='processor')
+            self.processor_thread.start()
         
         def audio_callback(indata, outdata, frames, time, status):
             if status:
                 print(status)
             
-            try:
-                if not self.input_queue.full():
-                    self.input_queue.put_nowait(indata.copy().flatten())
-                else:
-                    self.drop_count += 1
-            except queue.Full:
-                pass
-            
-            try:
-                if not self.output_queue.empty():
-                    output_data = self.output_queue.get_nowait()
-                    output_data = output_data.astype(np.float32) * 0.8
-                    
-                    if output_data.size != frames:
-                        if output_data.size > frames:
-                            output_data = output_data[:frames]
-                        else:
-                            temp = np.zeros(frames, dtype=np.float32)
-                            temp[:output_data.size] = output_data
-                            output_data = temp
-                    
-                    outdata[:] = output_data.reshape(-1, self.CHANNELS)
-                else:
-                    outdata.fill(0)
-            except queue.Empty:
-                outdata.fill(0)
+            with span('callback'):
+                with span('push_input'):
+                    self._push_input(indata[:, 0])
+                with span('jitter_read'):
+                    outdata[:] = self.jitter_buffer.read(frames).reshape(-1, self.CHANNELS)
         
-        self.stream = sd.Stream(
+        self.stream = self.backend.open_stream(
+            samplerate=self.DEVICE_RATE,
+            blocksize=self.blocksize,
             channels=self.CHANNELS,
-            samplerate=self.RATE,
-            blocksize=self.CHUNK,
-            dtype=np.float32,
             callback=audio_callback,
             device=(self.input_device, self.output_device),
-            latency='high'
+            latency=self.stream_latency
         )
         self.stream.start()
 
     def stop(self):
         self.is_running = False
+        self.wake_event.set()
         if hasattr(self, 'stream'):
             self.stream.stop()
             self.stream.close()
         if hasattr(self, 'processor_thread'):
             self.processor_thread.join()
+        if self.isolate:
+            self.processor.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.output_recorder is not None:
+            self._flush_unrecorded()
+            self.output_recorder.close()
+        if self.trace_path is not None:
+            tracer.disable()
+            tracer.dump(self.trace_path, self.processor.trace_events if self.isolate else ())
 
     def get_stats(self):
-        avg_latency = (self.total_latency / self.process_count) * 1000 if self.process_count > 0 else 0
-        return {
+        processor = self.processor
+        avg_latency = (processor.total_latency / processor.process_count) * 1000 if processor.process_count > 0 else 0
+        stats = {
             'dropped_frames': self.drop_count,
             'average_latency': f"{avg_latency:.1f}ms",
-            'input_queue_size': self.input_queue.qsize(),
-            'output_queue_size': self.output_queue.qsize(),
-            'processed_chunks': self.process_count,
-            'buffer_size': len(self.chunk_buffer),
-            'is_speech': self.last_was_speech
+            'input_queue_size': self._backlog(),
+            'output_buffer': f"{self.jitter_buffer.latency() * 1000:.0f}ms",
+            'underruns': self.jitter_buffer.underruns,
+            'concealed': f"{self.jitter_buffer.concealed_samples / self.DEVICE_RATE * 1000:.0f}ms",
+            'slipped': f"{self.jitter_buffer.slipped_samples / self.DEVICE_RATE * 1000:.0f}ms",
+            'revised': f"{self.jitter_buffer.revised_samples / self.DEVICE_RATE * 1000:.0f}ms",
+            'device_rate': self.DEVICE_RATE,
+            'processed_chunks': processor.process_count,
+            'buffer_size': processor.buffer_size,
+            'is_speech': processor.last_was_speech,
+            'idle': self.idle,
+            'recording_dropped': self.output_recorder.dropped_samples if self.output_recorder is not None else 0,
+            'quality': QUALITY_TIERS[processor.quality]['name'],
+            'memory': self.memory_stats()
         }
+        if not self.isolate and processor.latent_cache is not None:
+            stats['latent_cache'] = processor.latent_cache.stats()
+        return stats
+
+    def memory_stats(self):
+        # This process, and the inference process when isolated
+        stats = {key: round(value, 1) for key, value in self.memory_gauge.read().items()}
+        if self.isolate and self.processor.memory is not None:
+            stats['worker'] = {key: round(value, 1) for key, value in self.processor.memory.items()}
+        return stats
 
 def main():
+    import sounddevice as sd
+
     print("\nAvailable audio devices:")
     print(sd.query_devices())
     
@@ -0,0 +1,267 @@
+import threading
+
+import numpy as np
+
+
+class JitterBuffer:
+    """
+    Sits between the conversion thread (write) and the audio callback (read)
+    and keeps the output latency bounded:
+
+    - playback starts `target_latency` after the first audio arrives
+    - a short deficit is concealed by repeating the last pitch period of the
+      output with a decaying gain, crossfaded in and out
+    - a concealment longer than `max_conceal` fades to silence and re-primes
+    - when the lowest fill level seen over `slip_window` stays more than
+      `slack` above the target, the excess is skipped with a crossfade
+    - the target itself grows by `adapt_step` after a window with underruns
+      (never beyond `max_latency`) and shrinks back towards `target_latency`
+      after clean windows
+    - pause() announces that writes are about to stop on purpose (idle input):
+      once drained the buffer goes quiet without concealing or counting an
+      underrun, and re-primes on the next write after resume()
+    - revise() swaps a corrected version of the latest write in for the
+      part of it not played yet (speculative output)
+
+    so the steady-state latency stays within target + one write + slack.
+    """
+    def __init__(self, samplerate, target_latency=0.1, max_latency=0.3, slack=0.05, slip_window=2.0, max_conceal=0.12, fade=0.005, adapt_step=0.02, capacity=5.0):
+        self.samplerate = samplerate
+        self.base_target = int(samplerate * target_latency)
+        self.max_target = max(self.base_target, int(samplerate * max_latency))
+        self.adapt_step = int(samplerate * adapt_step)
+        self.target = self.base_target
+        self.slack = int(samplerate * slack)
+        self.slip_window = int(samplerate * slip_window)
+        self.max_conceal = int(samplerate * max_conceal)
+        self.fade_size = max(1, int(samplerate * fade))
+
+        self.buffer = np.zeros(int(samplerate * capacity), dtype=np.float32)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.lock = threading.Lock()
+
+        self.primed = False
+        self.paused = False
+        self.lead_in = 0
+        self.fade_pending = False
+        self.min_fill = None
+        self.window_read = 0
+        self.window_underruns = 0
+
+        # Concealment state
+        self.history = np.zeros(int(samplerate * 0.03), dtype=np.float32)
+        self.concealed = 0
+        self.period = None
+        self.period_pos = 0
+
+        fade_pos = np.linspace(0, np.pi / 2, self.fade_size, dtype=np.float32)
+        self.fade_in = np.sin(fade_pos) ** 2
+        self.fade_out = np.cos(fade_pos) ** 2
+
+        self.underruns = 0
+        self.concealed_samples = 0
+        self.slipped_samples = 0
+        self.overflow_samples = 0
+        self.revised_samples = 0
+        self.late_revisions = 0
+
+    @property
+    def fill(self):
+        return self.write_pos - self.read_pos
+
+    def latency(self):
+        return self.fill / self.samplerate
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+
+    def resume(self):
+        with self.lock:
+            self.paused = False
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        capacity = len(self.buffer)
+        truncated = max(0, len(samples) - capacity)
+        samples = samples[truncated:]
+        with self.lock:
+            overflow = self.fill + len(samples) - capacity
+            if overflow > 0:
+                self.read_pos += overflow
+                self.overflow_samples += overflow
+            self.overflow_samples += truncated
+            self._copy_in(samples)
+
+    def revise(self, samples):
+        # `samples` replaces the last len(samples) samples written. Those
+        # already played stay as they were, the switch at the play position
+        # is crossfaded
+        samples = np.asarray(samples, dtype=np.float32)
+        with self.lock:
+            start = self.write_pos - len(samples)
+            skip = max(0, self.read_pos - start)
+            if skip >= len(samples):
+                self.late_revisions += 1
+                return
+            samples = samples[skip:].copy()
+            if skip > 0:
+                m = min(self.fade_size, len(samples))
+                old = np.empty(m, dtype=np.float32)
+                self._peek(old, 0)
+                samples[:m] = old * self.fade_out[:m] + samples[:m] * self.fade_in[:m]
+            self._store(start + skip, samples)
+            self.revised_samples += len(samples)
+
+    def read(self, frames):
+        out = np.zeros(frames, dtype=np.float32)
+        with self.lock:
+            if not self.primed:
+                if self.fill == 0:
+                    self._remember(out)
+                    return out
+                # Hold back `target` samples of silence so the buffer is that far
+                # ahead of playback when the next write is due
+                self.primed = True
+                self.lead_in = self.target
+                self.fade_pending = True
+
+            start = min(frames, self.lead_in)
+            self.lead_in -= start
+            if start == frames:
+                self._remember(out)
+                return out
+
+            self._maybe_slip()
+
+            n = min(frames - start, self.fill)
+            self._copy_out(out[start:start + n])
+            if self.fade_pending and n > 0:
+                m = min(n, self.fade_size)
+                out[start:start + m] *= self.fade_in[:m]
+                self.fade_pending = False
+            if self.concealed and n > 0:
+                # Real audio is back: crossfade out of the concealment
+                m = min(n, self.fade_size)
+                tail = self._conceal(m, advance=False)
+                out[start:start + m] = tail * self.fade_out[:m] + out[start:start + m] * self.fade_in[:m]
+                self.concealed = 0
+                self.period = None
+
+            if start + n < frames and self.paused:
+                # Drained on purpose: stay silent until the next write
+                self.primed = False
+            elif start + n < frames:
+                if not self.concealed:
+                    # Once per dry spell, however many callbacks it spans
+                    self.underruns += 1
+                    self.window_underruns += 1
+                missing = frames - start - n
+                out[start + n:] = self._conceal(missing)
+                self.concealed_samples += missing
+                if self.concealed >= self.max_conceal:
+                    # Too long to hide: go quiet and re-prime on the next write
+                    self.primed = False
+                    self.concealed = 0
+                    self.period = None
+
+            self._track_fill(frames)
+            self._remember(out)
+        return out
+
+    def _copy_in(self, samples):
+        self._store(self.write_pos, samples)
+        self.write_pos += len(samples)
+
+    def _store(self, pos, samples):
+        capacity = len(self.buffer)
+        start = pos % capacity
+        first = min(len(samples), capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+
+    def _copy_out(self, out):
+        capacity = len(self.buffer)
+        start = self.read_pos % capacity
+        first = min(len(out), capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:] = self.buffer[:len(out) - first]
+        self.read_pos += len(out)
+
+    def _track_fill(self, frames):
+        fill = self.fill
+        self.min_fill = fill if self.min_fill is None else min(self.min_fill, fill)
+        self.window_read += frames
+
+    def _maybe_slip(self):
+        if self.window_read < self.slip_window or self.min_fill is None:
+            return
+
+        if self.window_underruns:
+            self.target = min(self.target + self.adapt_step, self.max_target)
+        elif self.target > self.base_target:
+            self.target = max(self.target - self.adapt_step // 2, self.base_target)
+
+        excess = self.min_fill - self.target
+        self.min_fill = None
+        self.window_read = 0
+        self.window_underruns = 0
+        if excess <= self.slack or self.fill < excess + self.fade_size:
+            return
+
+        # Skip `excess` samples, crossfading from the old read position into the new one
+        old = np.empty(self.fade_size, dtype=np.float32)
+        new = np.empty(self.fade_size, dtype=np.float32)
+        self._peek(old, 0)
+        self._peek(new, excess)
+        capacity = len(self.buffer)
+        self.read_pos += excess
+        mixed = old * self.fade_out + new * self.fade_in
+        start = self.read_pos % capacity
+        first = min(self.fade_size, capacity - start)
+        self.buffer[start:start + first] = mixed[:first]
+        self.buffer[:self.fade_size - first] = mixed[first:]
+        self.slipped_samples += excess
+
+    def _peek(self, out, offset):
+        capacity = len(self.buffer)
+        start = (self.read_pos + offset) % capacity
+        first = min(len(out), capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:] = self.buffer[:len(out) - first]
+
+    def _remember(self, out):
+        n = len(self.history)
+        if len(out) >= n:
+            self.history[:] = out[-n:]
+        else:
+            self.history[:-len(out)] = self.history[len(out):]
+            self.history[-len(out):] = out
+
+    def _find_period(self):
+        # Strongest autocorrelation lag between 2.5ms and 15ms of the recent output
+        x = self.history
+        lo = int(self.samplerate * 0.0025)
+        hi = min(int(self.samplerate * 0.015), len(x) // 2)
+        ref = x[-hi:]
+        lags = np.arange(lo, hi)
+        windows = np.lib.stride_tricks.sliding_window_view(x, hi)
+        candidates = windows[len(x) - hi - lags]
+        scores = candidates @ ref / (np.linalg.norm(candidates, axis=1) * np.linalg.norm(ref) + 1e-8)
+        return int(lags[np.argmax(scores)])
+
+    def _conceal(self, count, advance=True):
+        # Repeat the last pitch period, decaying linearly to silence at max_conceal
+        if self.period is None:
+            self.period = self._find_period()
+            self.period_pos = 0
+            self.cycle = self.history[-self.period:].copy()
+        idx = (self.period_pos + np.arange(count)) % self.period
+        pos = self.concealed + np.arange(count)
+        gain = np.clip(1.0 - pos / self.max_conceal, 0.0, 1.0).astype(np.float32)
+        out = self.cycle[idx] * gain
+        if advance:
+            self.concealed += count
+            self.period_pos = (self.period_pos + count) % self.period
+        return out
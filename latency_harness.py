@@ -0,0 +1,187 @@
+import warnings
+warnings.filterwarnings('ignore')
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from backends import VirtualAudioDevice
+from core import RealtimeVoiceConverter
+from vc import ToneColorConverter
+from vc.resample import StreamResampler
+
+
+def burst_train(samplerate, duration=20.0, period=2.0, burst=0.3, frequency=180.0, amplitude=0.3, seed=0):
+    """
+    Harmonic-rich bursts (well above the VAD threshold) separated by silence.
+    Burst spacing varies by ±25% around `period`, so the envelope correlation
+    in measure_latency has one peak instead of one per period.
+    """
+    t = np.arange(int(samplerate * duration)) / samplerate
+    tone = amplitude * np.sign(np.sin(2 * np.pi * frequency * t)) * 0.5 + amplitude * 0.5 * np.sin(2 * np.pi * 2.3 * frequency * t)
+    gaps = np.random.default_rng(seed).uniform(0.75, 1.25, int(duration / period) + 1) * period
+    starts = np.concatenate([[0.0], np.cumsum(gaps)])
+    gate = t - starts[np.searchsorted(starts, t, side='right') - 1] < burst
+    return (tone * gate).astype(np.float32), np.flatnonzero(np.diff(gate.astype(np.int8)) == 1) + 1
+
+
+def envelope(x, hop):
+    n = len(x) // hop
+    return np.sqrt(np.mean(x[:n * hop].reshape(n, hop) ** 2, axis=1))
+
+
+def measure_latency(source, output, samplerate, onsets, max_latency=3.0, hop_seconds=0.005):
+    """
+    End-to-end latency as the lag maximizing the correlation of the input and
+    output energy envelopes, plus the per-burst onset delay in the output.
+    """
+    hop = int(samplerate * hop_seconds)
+    env_in = envelope(source, hop)
+    env_out = envelope(output, hop)
+    max_lag = min(int(max_latency / hop_seconds), len(env_out) - 1)
+
+    n = min(len(env_in), len(env_out) - max_lag)
+    a = env_in[:n] - env_in[:n].mean()
+    windows = np.lib.stride_tricks.sliding_window_view(env_out, n)[:max_lag + 1]
+    windows = windows - windows.mean(axis=1, keepdims=True)
+    scores = windows @ a / (np.linalg.norm(windows, axis=1) * np.linalg.norm(a) + 1e-12)
+    lag = int(np.argmax(scores))
+
+    threshold = 0.1 * env_out.max() if env_out.max() > 0 else np.inf
+    onset_delays = []
+    for onset in onsets:
+        start = onset // hop
+        active = np.flatnonzero(env_out[start:start + max_lag] > threshold)
+        if len(active):
+            onset_delays.append(active[0] * hop_seconds)
+
+    return {
+        'end_to_end_latency_ms': lag * hop_seconds * 1000,
+        'correlation': float(scores[lag]),
+        'onset_latency_ms': {
+            'median': float(np.median(onset_delays) * 1000) if onset_delays else None,
+            'max': float(np.max(onset_delays) * 1000) if onset_delays else None,
+            'detected': len(onset_delays),
+            'expected': len(onsets),
+        },
+    }
+
+
+def run_harness(converter, target_se, source, samplerate, onsets=(), speed=1.0, model_path=None, **converter_options):
+    """
+    `speed=None` runs unpaced: each callback waits until its input has been
+    converted, so the run measures the pipeline's framing and buffering
+    latency with conversions taking no simulated time.
+    """
+    if speed is None and converter_options.get('isolate'):
+        raise ValueError("unpaced runs need in-process inference")
+    device = VirtualAudioDevice(source, samplerate, speed=speed)
+    rvc = RealtimeVoiceConverter(
+        model_path=model_path,
+        converter=converter,
+        target_se=target_se,
+        backend=device,
+        samplerate=samplerate,
+        **converter_options
+    )
+    if speed is None:
+        device.pace = rvc.wait_processed
+    rvc.start()
+    while not device.finished.wait(0.1):
+        pass
+    rvc.stop()
+
+    output = device.output()
+    process_times = np.array(rvc.processor.process_times) * 1000
+    callback_times = np.array(device.callback_times) * 1000
+    jitter_buffer = rvc.jitter_buffer
+    report = measure_latency(source, output, samplerate, onsets)
+    report.update({
+        'underruns': jitter_buffer.underruns,
+        'concealed_ms': jitter_buffer.concealed_samples / samplerate * 1000,
+        'slipped_ms': jitter_buffer.slipped_samples / samplerate * 1000,
+        'revised_ms': jitter_buffer.revised_samples / samplerate * 1000,
+        'late_revisions': jitter_buffer.late_revisions,
+        'overruns': rvc.drop_count,
+        'late_callbacks': device.late_callbacks,
+        'callback_ms': {
+            'mean': float(callback_times.mean()) if len(callback_times) else 0.0,
+            'max': float(callback_times.max()) if len(callback_times) else 0.0,
+        },
+        'conversion_ms': {
+            'mean': float(process_times.mean()) if len(process_times) else 0.0,
+            'std': float(process_times.std()) if len(process_times) else 0.0,
+            'p95': float(np.percentile(process_times, 95)) if len(process_times) else 0.0,
+            'max': float(process_times.max()) if len(process_times) else 0.0,
+        },
+    })
+    return report, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware-free end-to-end latency harness")
+    parser.add_argument('--model', default='vc/model.pth')
+    parser.add_argument('--target', default='samples/tsu.wav')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--input', help="WAV file to feed (default: a burst train)")
+    parser.add_argument('--samplerate', type=int, default=48000)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--speed', type=float, default=1.0, help="Clock speed relative to real time (0 = unpaced: input waits for each conversion)")
+    parser.add_argument('--target-latency', type=float, default=0.1)
+    parser.add_argument('--hop', type=int, help="Overlap-add hop in model-rate samples (default: whole chunks)")
+    parser.add_argument('--speculative', action='store_true', help="Emit each chunk early and revise it a step later")
+    parser.add_argument('--lookahead', type=int, help="Speculative lookahead in model-rate samples (default: chunk / 8)")
+    parser.add_argument('--blocksize', type=int, default=0, help="Device callback block size in frames (default: 256 on the virtual device)")
+    parser.add_argument('--align-splices', action='store_true', help="Splice chunks at the best-correlated offset")
+    parser.add_argument('--cache-latents', type=int, metavar='MARGIN', help="Reuse source latents across windows, recomputing MARGIN frames either side")
+    parser.add_argument('--isolate', action='store_true', help="Run inference in a separate process")
+    parser.add_argument('--record', help="Capture the session to this log for session_log.py replay")
+    parser.add_argument('--trace', help="Write a Chrome trace of the run to this JSON file")
+    parser.add_argument('--record-output', help="Record the converted stream to this WAV/FLAC file")
+    parser.add_argument('--output', help="Write the captured output to this WAV file")
+    args = parser.parse_args()
+
+    converter = ToneColorConverter(ckpt_path=args.model, device=args.device)
+    target_se = converter.extract_target_se(args.target)
+
+    if args.input:
+        import soundfile as sf
+        source, rate = sf.read(args.input, dtype='float32')
+        if source.ndim > 1:
+            source = source.mean(axis=1)
+        if rate != args.samplerate:
+            source = StreamResampler(rate, args.samplerate).process(source)
+        onsets = []
+    else:
+        source, onsets = burst_train(args.samplerate, args.duration)
+
+    start_time = time.time()
+    report, output = run_harness(
+        converter, target_se, source, args.samplerate, onsets,
+        speed=args.speed or None,
+        model_path=args.model,
+        target_latency=args.target_latency,
+        isolate=args.isolate,
+        hop=args.hop,
+        speculative=args.speculative,
+        lookahead=args.lookahead,
+        cache_margin=args.cache_latents,
+        align_splices=args.align_splices,
+        blocksize=args.blocksize,
+        record_path=args.record,
+        trace_path=args.trace,
+        output_path=args.record_output
+    )
+    report['wall_time_s'] = time.time() - start_time
+    print(json.dumps(report, indent=2))
+    if report['overruns']:
+        print(f"Warning: {report['overruns']} input chunks were dropped, the latency figures don't reflect a clean run")
+
+    if args.output:
+        import soundfile as sf
+        sf.write(args.output, output, args.samplerate)
+
+if __name__ == "__main__":
+    main()
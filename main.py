@@ -1,14 +1,167 @@
+import argparse
 import sys
 import os
+import time
+import threading
 from pathlib import Path
+
+STARTUP_TIME = time.perf_counter()
+
+
+def parse_args(argv):
+    # Options we don't know (Qt's own, e.g. -platform) are left for QApplication
+    parser = argparse.ArgumentParser(description="Realtime voice conversion")
+    parser.add_argument('--profile-startup', action='store_true', help="Log startup timings")
+    parser.add_argument('--isolate-inference', action='store_true', help="Run the model in a separate process")
+    parser.add_argument('--record-session', metavar='PATH', help="Log the session for session_log.py replay")
+    parser.add_argument('--trace', metavar='PATH', help="Write a Chrome trace on stop")
+    parser.add_argument('--record-output', metavar='PATH', help="Record the converted stream to WAV/FLAC")
+    parser.add_argument('--hop', type=int, help="Overlap-add hop in model-rate samples")
+    parser.add_argument('--speculative', action='store_true', help="Emit each chunk early and revise it a step later")
+    parser.add_argument('--lookahead', type=int, help="Speculative lookahead in model-rate samples")
+    parser.add_argument('--align-splices', action='store_true', help="Splice chunks at the best-correlated offset")
+    parser.add_argument('--blocksize', type=int, default=0, help="Device block size in frames (0: host default)")
+    parser.add_argument('--cache-latents', type=int, metavar='MARGIN', help="Reuse source latents across windows, recomputing MARGIN frames per side (approximate below the 64-frame receptive field)")
+    return parser.parse_known_args(argv)
+
+
+ARGS, QT_ARGV = parse_args(sys.argv[1:])
+
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, 
                              QPushButton, QComboBox, QLineEdit,
                              QVBoxLayout, QHBoxLayout, QFileDialog, QStyledItemDelegate,
                              QMessageBox)
-from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, Property
+from PySide6.QtCore import Qt, QObject, QThread, QTimer, QPropertyAnimation, QEasingCurve, Property, Signal
 from PySide6.QtGui import QPainter, QPainterPath, QColor, QFont
-import sounddevice as sd
-from core import RealtimeVoiceConverter
+
+# sounddevice, torch and the vc package are imported lazily: torch alone takes
+# seconds to import, so the window is shown first and the model is loaded by
+# ModelLoader on a background thread.
+MODEL_PATH = 'vc/model.pth'
+
+
+def log_startup(message):
+    if ARGS.profile_startup:
+        print(f"[startup] {(time.perf_counter() - STARTUP_TIME) * 1000:.0f}ms {message}")
+
+
+class ModelLoader(QObject):
+    loaded = Signal(object)
+    failed = Signal(str)
+    progress = Signal(int, str)
+
+    def __init__(self, model_path):
+        super().__init__()
+        self.model_path = model_path
+        self.converter = None
+        self.error = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            self.progress.emit(0, "Importing libraries...")
+            import torch
+            import core  # noqa: F401  (imports vc off the GUI thread)
+            from vc import ToneColorConverter
+            log_startup("heavy imports done")
+
+            self.progress.emit(40, "Loading model...")
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            converter = ToneColorConverter(ckpt_path=self.model_path, device=device)
+            log_startup("model loaded")
+            self.progress.emit(70, "Warming up model...")
+            converter.warmup()
+            log_startup("model warmed up")
+            self.progress.emit(100, "Model ready")
+
+            self.converter = converter
+            self.loaded.emit(converter)
+        except Exception as e:
+            self.error = str(e)
+            self.failed.emit(self.error)
+
+
+class StartWorker(QThread):
+    """
+    Extracts the target voice and opens the audio stream off the GUI thread.
+    cancel() is checked between steps; a cancelled start is torn down instead
+    of being reported.
+    """
+    progress = Signal(int, str)
+    started_ok = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, tone_converter, target_voice_path, input_device, output_device, parent=None):
+        super().__init__(parent)
+        self.tone_converter = tone_converter
+        self.target_voice_path = target_voice_path
+        self.input_device = input_device
+        self.output_device = output_device
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        converter = None
+        try:
+            from core import RealtimeVoiceConverter
+
+            self.progress.emit(10, "Extracting target voice...")
+            target_se = self.tone_converter.extract_target_se(self.target_voice_path)
+            if self._cancelled:
+                return
+
+            self.progress.emit(70, "Opening audio stream...")
+            converter = RealtimeVoiceConverter(
+                model_path=MODEL_PATH,
+                device=self.tone_converter.device,
+                input_device=self.input_device,
+                output_device=self.output_device,
+                converter=self.tone_converter,
+                target_se=target_se,
+                isolate=ARGS.isolate_inference,
+                record_path=ARGS.record_session,
+                trace_path=ARGS.trace,
+                output_path=ARGS.record_output,
+                hop=ARGS.hop,
+                speculative=ARGS.speculative,
+                lookahead=ARGS.lookahead,
+                cache_margin=ARGS.cache_latents,
+                align_splices=ARGS.align_splices,
+                blocksize=ARGS.blocksize
+            )
+            converter.start()
+            if self._cancelled:
+                converter.stop()
+                return
+
+            self.progress.emit(100, "Running")
+            self.started_ok.emit(converter)
+        except Exception as e:
+            if converter is not None:
+                converter.stop()
+            if not self._cancelled:
+                self.failed.emit(str(e))
+
+
+class StopWorker(QThread):
+    """
+    Stops a running converter off the GUI thread: stop() waits for the chunk
+    being converted and closes the audio stream, which can take a while.
+    """
+    def __init__(self, converter, parent=None):
+        super().__init__(parent)
+        self.converter = converter
+
+    def run(self):
+        self.converter.stop()
+
 
 class SwitchButton(QWidget):
     def __init__(self, parent=None):
@@ -19,12 +172,22 @@ class SwitchButton(QWidget):
         self._thumb_color = QColor("#FFFFFF")
         self._track_color_checked = QColor("#2196F3")  # Material Blue
         self._thumb_position = 2
+        self._is_loading = False
+        self._pulse = 1.0
         
         # Setup animation
         self.animation = QPropertyAnimation(self, b"position", self)
         self.animation.setEasingCurve(QEasingCurve.Type.InOutCubic)
         self.animation.setDuration(200)
 
+        # Track pulses while a start is in progress
+        self.pulse_animation = QPropertyAnimation(self, b"pulse", self)
+        self.pulse_animation.setDuration(900)
+        self.pulse_animation.setKeyValueAt(0, 1.0)
+        self.pulse_animation.setKeyValueAt(0.5, 0.35)
+        self.pulse_animation.setKeyValueAt(1, 1.0)
+        self.pulse_animation.setLoopCount(-1)
+
     def get_position(self):
         return self._thumb_position
 
@@ -34,6 +197,24 @@ class SwitchButton(QWidget):
 
     position = Property(float, get_position, set_position)
 
+    def get_pulse(self):
+        return self._pulse
+
+    def set_pulse(self, value):
+        self._pulse = value
+        self.update()
+
+    pulse = Property(float, get_pulse, set_pulse)
+
+    def set_loading(self, loading):
+        self._is_loading = loading
+        if loading:
+            self.pulse_animation.start()
+        else:
+            self.pulse_animation.stop()
+            self._pulse = 1.0
+        self.update()
+
     def mousePressEvent(self, event):
         self._is_checked = not self._is_checked
         self.animation.setStartValue(self._thumb_position)
@@ -49,6 +230,10 @@ class SwitchButton(QWidget):
 
         # Draw track
         track_opacity = 0.6 if not self._is_checked else 1.0
+        if not self.isEnabled():
+            track_opacity = 0.3
+        elif self._is_loading:
+            track_opacity = self._pulse
         painter.setOpacity(track_opacity)
         track_color = self._track_color if not self._is_checked else self._track_color_checked
         painter.setBrush(track_color)
@@ -64,7 +249,9 @@ class SwitchButton(QWidget):
         font.setPointSize(7)
         font.setBold(True)
         painter.setFont(font)
-        if self._is_checked:
+        if self._is_loading:
+            painter.drawText(9, 20, "...")
+        elif self._is_checked:
             painter.drawText(7, 20, "ON")
         else:
             painter.drawText(30, 20, "OFF")
@@ -110,18 +297,30 @@ class ComboBoxItemDelegate(QStyledItemDelegate):
             painter.restore()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, model_loader):
         super().__init__()
         self.setWindowTitle("Voice Conversion")
         self.setFixedSize(500, 400)
         
         self.setStyleSheet("background-color: white;")
         self.converter = None  # Voice converter 인스턴스 저장용
+        self.tone_converter = None  # 백그라운드에서 로드된 ToneColorConverter
+        self.model_loader = model_loader
+        self.start_worker = None  # 시작 중인 StartWorker
+        self.workers = []  # 취소된 것 포함, 아직 실행 중인 워커
+
+        # 실행 중 통계 표시용 타이머
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(500)
+        self.stats_timer.timeout.connect(self.update_stats)
         
         self._setup_ui()
         self._setup_styles()
         self._setup_connections()
 
+        # 디바이스 목록은 창이 뜬 뒤에 채움 (sounddevice import 지연)
+        QTimer.singleShot(0, self._populate_devices)
+
     def _setup_ui(self):
         # Create central widget and main layout
         central_widget = QWidget()
@@ -134,6 +333,8 @@ class MainWindow(QMainWindow):
         voice_header = QHBoxLayout()
         self.voice_label = QLabel("Voice")
         self.switch = SwitchButton()
+        self.switch.setEnabled(False)
+        self.switch.setToolTip("Loading model...")
         voice_header.addWidget(self.voice_label)
         voice_header.addStretch()
         voice_header.addWidget(self.switch)
@@ -161,14 +362,45 @@ class MainWindow(QMainWindow):
         # 커스텀 델리게이트 설정
         self.input_combo.setItemDelegate(ComboBoxItemDelegate(self.input_combo))
         
+        self.input_combo.view().setSpacing(0)
+        self.input_combo.view().setContentsMargins(0, 0, 0, 0)
+        input_layout.addWidget(input_label)
+        input_layout.addWidget(self.input_combo)
+        main_layout.addLayout(input_layout)
+
+        # Output Device
+        output_layout = QVBoxLayout()
+        output_layout.setSpacing(4)
+        output_label = QLabel("Select Output Device")
+        self.output_combo = QComboBox()
+        
+        # 커스텀 델리게이트 설정
+        self.output_combo.setItemDelegate(ComboBoxItemDelegate(self.output_combo))
+        
+        self.output_combo.view().setSpacing(0)
+        self.output_combo.view().setContentsMargins(0, 0, 0, 0)
+        output_layout.addWidget(output_label)
+        output_layout.addWidget(self.output_combo)
+        main_layout.addLayout(output_layout)
+
+        main_layout.addStretch()
+
+        # Status / live stats
+        self.status_label = QLabel("Loading model...")
+        self.status_label.setObjectName("statusLabel")
+        main_layout.addWidget(self.status_label)
+
+    def _populate_devices(self):
+        import sounddevice as sd
+
         # Get input devices
-        input_devices = sd.query_devices()
+        devices = sd.query_devices()
         hostapis = sd.query_hostapis()
         input_device_names = []
         self.input_device_ids = []  # Store device IDs
         default_input_idx = 0  # Default index to select
         
-        for i, device in enumerate(input_devices):
+        for i, device in enumerate(devices):
             if device['max_input_channels'] > 0:  # Input device
                 # Get hostapi name
                 hostapi_name = hostapis[device['hostapi']]['name']
@@ -180,27 +412,13 @@ class MainWindow(QMainWindow):
 
         self.input_combo.addItems(input_device_names)
         self.input_combo.setCurrentIndex(default_input_idx)
-        self.input_combo.view().setSpacing(0)
-        self.input_combo.view().setContentsMargins(0, 0, 0, 0)
-        input_layout.addWidget(input_label)
-        input_layout.addWidget(self.input_combo)
-        main_layout.addLayout(input_layout)
 
-        # Output Device
-        output_layout = QVBoxLayout()
-        output_layout.setSpacing(4)
-        output_label = QLabel("Select Output Device")
-        self.output_combo = QComboBox()
-        
-        # 커스텀 델리게이트 설정
-        self.output_combo.setItemDelegate(ComboBoxItemDelegate(self.output_combo))
-        
         # Get output devices
         output_device_names = []
         self.output_device_ids = []  # Store device IDs
         default_output_idx = 0  # Default index to select
         
-        for i, device in enumerate(input_devices):
+        for i, device in enumerate(devices):
             if device['max_output_channels'] > 0:  # Output device
                 # Get hostapi name
                 hostapi_name = hostapis[device['hostapi']]['name']
@@ -212,81 +430,158 @@ class MainWindow(QMainWindow):
 
         self.output_combo.addItems(output_device_names)
         self.output_combo.setCurrentIndex(default_output_idx)
-        self.output_combo.view().setSpacing(0)
-        self.output_combo.view().setContentsMargins(0, 0, 0, 0)
-        output_layout.addWidget(output_label)
-        output_layout.addWidget(self.output_combo)
-        main_layout.addLayout(output_layout)
+        log_startup("devices listed")
 
-        main_layout.addStretch()
+    def handle_model_loaded(self, tone_converter):
+        self.tone_converter = tone_converter
+        self.switch.setEnabled(True)
+        self.switch.setToolTip("")
+        self.switch.update()
+        self.status_label.setText("Ready")
+
+    def handle_model_failed(self, message):
+        self.switch.setToolTip(f"Failed to load model: {message}")
+        self.status_label.setText("Failed to load model")
+        QMessageBox.critical(self, "Error", f"Failed to load model: {message}")
+
+    def handle_progress(self, percent, message):
+        if isinstance(self.sender(), StartWorker) and self.sender() is not self.start_worker:
+            return  # 취소된 워커
+        self.status_label.setText(f"{message} ({percent}%)" if percent < 100 else message)
+
+    def update_stats(self):
+        if not self.converter:
+            return
+        stats = self.converter.get_stats()
+        if stats['idle']:
+            self.status_label.setText(f"Idle (waiting for speech) · Dropped {stats['dropped_frames']} · Underruns {stats['underruns']}")
+            return
+        self.status_label.setText(
+            f"Latency {stats['average_latency']} · Queue {stats['input_queue_size']} · Buffer {stats['output_buffer']} · "
+            f"Dropped {stats['dropped_frames']} · Underruns {stats['underruns']} · Quality {stats['quality']}"
+        )
 
     def _setup_connections(self):
         self.select_button.clicked.connect(self.select_audio_file)
         self.switch.mousePressEvent = self.handle_switch_click  # 스위치 이벤트 오버라이드
 
+        # 로더가 창 생성 전에 끝났을 수도 있으므로 연결 후 상태 확인
+        self.model_loader.loaded.connect(self.handle_model_loaded)
+        self.model_loader.failed.connect(self.handle_model_failed)
+        self.model_loader.progress.connect(self.handle_progress)
+        if self.model_loader.converter is not None:
+            self.handle_model_loaded(self.model_loader.converter)
+        elif self.model_loader.error is not None:
+            self.handle_model_failed(self.model_loader.error)
+
     def handle_switch_click(self, event):
-        if not self.file_path.text():
+        # 시작 중에 다시 누르면 취소
+        if self.start_worker is not None:
+            self.cancel_voice_conversion()
+            return
+        # 이전 세션을 정리하는 중에는 다시 시작하지 않음 (같은 모델/장치를 공유)
+        if self.workers:
+            return
+
+        if not self.switch._is_checked and not self.file_path.text():
             QMessageBox.warning(self, "Warning", "Please select a voice file first.")
             return
             
-        # 기존 스위치 동작 수행
-        self.switch._is_checked = not self.switch._is_checked
-        self.switch.animation.setStartValue(self.switch._thumb_position)
-        
-        if self.switch._is_checked:
-            self.switch.animation.setEndValue(27)
+        if not self.switch._is_checked:
+            self._animate_switch(True)
             self.start_voice_conversion()
         else:
-            self.switch.animation.setEndValue(2)
+            self._animate_switch(False)
             self.stop_voice_conversion()
-            
+
+    def _animate_switch(self, checked):
+        self.switch._is_checked = checked
+        self.switch.animation.setStartValue(self.switch._thumb_position)
+        self.switch.animation.setEndValue(27 if checked else 2)
         self.switch.animation.start()
 
+    def _set_inputs_enabled(self, enabled):
+        self.input_combo.setEnabled(enabled)
+        self.output_combo.setEnabled(enabled)
+        self.select_button.setEnabled(enabled)
+        self.file_path.setEnabled(enabled)
+
     def start_voice_conversion(self):
-        try:
-            # 현재 선택된 디바이스 인덱스 가져오기
-            input_idx = self.input_device_ids[self.input_combo.currentIndex()]
-            output_idx = self.output_device_ids[self.output_combo.currentIndex()]
-            
-            # Voice Converter 인스턴스 생성
-            self.converter = RealtimeVoiceConverter(
-                model_path='vc/model.pth',  # 모델 경로 설정
-                target_voice_path=self.file_path.text(),  # 선택된 음성 파일 경로
-                device='cuda' if torch.cuda.is_available() else 'cpu',
-                input_device=input_idx,
-                output_device=output_idx
-            )
-            
-            # 변환 시작
-            self.converter.start()
-            
-            # UI 컴포넌트 비활성화
-            self.input_combo.setEnabled(False)
-            self.output_combo.setEnabled(False)
-            self.select_button.setEnabled(False)
-            self.file_path.setEnabled(False)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to start voice conversion: {str(e)}")
-            self.switch._is_checked = False
-            self.switch.animation.setStartValue(self.switch._thumb_position)
-            self.switch.animation.setEndValue(2)
-            self.switch.animation.start()
+        # 현재 선택된 디바이스 인덱스 가져오기
+        input_idx = self.input_device_ids[self.input_combo.currentIndex()]
+        output_idx = self.output_device_ids[self.output_combo.currentIndex()]
 
-    def stop_voice_conversion(self):
-        try:
-            if self.converter:
-                self.converter.stop()
-                self.converter = None
-            
-            # UI 컴포넌트 활성화
-            self.input_combo.setEnabled(True)
-            self.output_combo.setEnabled(True)
-            self.select_button.setEnabled(True)
-            self.file_path.setEnabled(True)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to stop voice conversion: {str(e)}")
+        # 모델/음성 로드는 워커 스레드에서 진행 (GUI 스레드 블로킹 방지)
+        self._set_inputs_enabled(False)
+        self.switch.set_loading(True)
+        self.start_worker = StartWorker(self.tone_converter, self.file_path.text(), input_idx, output_idx, self)
+        self.start_worker.progress.connect(self.handle_progress)
+        self.start_worker.started_ok.connect(self.handle_conversion_started)
+        self.start_worker.failed.connect(self.handle_conversion_failed)
+        self.start_worker.finished.connect(self.handle_worker_finished)
+        self.workers.append(self.start_worker)
+        self.start_worker.start()
+
+    def cancel_voice_conversion(self):
+        # 워커는 현재 단계를 마치고 결과를 버림; 끝날 때까지 로딩 상태 유지
+        self.start_worker.cancel()
+        self.start_worker = None
+        self._animate_switch(False)
+        self.status_label.setText("Cancelling...")
+
+    def handle_conversion_started(self, converter):
+        if self.sender().is_cancelled():
+            self._stop_in_background(converter)
+            return
+        self.start_worker = None
+        self.converter = converter
+        self.switch.set_loading(False)
+        self.stats_timer.start()
+
+    def handle_conversion_failed(self, message):
+        self.start_worker = None
+        self.switch.set_loading(False)
+        self._animate_switch(False)
+        self._set_inputs_enabled(True)
+        self.status_label.setText("Ready")
+        QMessageBox.critical(self, "Error", f"Failed to start voice conversion: {message}")
+
+    def handle_worker_finished(self):
+        worker = self.sender()
+        if worker is self.start_worker:
+            self.start_worker = None
+        if worker in self.workers:
+            self.workers.remove(worker)
+        worker.deleteLater()
+        if not self.workers and self.start_worker is None and self.converter is None:
+            # 취소/정지 정리가 모두 끝남
+            self.switch.set_loading(False)
+            self._set_inputs_enabled(True)
+            self.status_label.setText("Ready")
+
+    def _stop_in_background(self, converter):
+        # 처리 중인 청크가 끝날 때까지 GUI가 멈추지 않도록 워커에서 정리하고,
+        # 끝날 때까지 다시 시작하지 못하게 로딩 상태 유지
+        self.switch.set_loading(True)
+        self._set_inputs_enabled(False)
+        self.status_label.setText("Stopping...")
+        worker = StopWorker(converter, self)
+        worker.finished.connect(self.handle_worker_finished)
+        self.workers.append(worker)
+        worker.start()
+
+    def stop_voice_conversion(self, wait=False):
+        self.stats_timer.stop()
+        converter, self.converter = self.converter, None
+        if converter and not wait:
+            self._stop_in_background(converter)
+            return
+        if converter:
+            converter.stop()
+
+        # UI 컴포넌트 활성화
+        self._set_inputs_enabled(True)
+        self.status_label.setText("Ready")
 
     def select_audio_file(self):
         file_name, _ = QFileDialog.getOpenFileName(
@@ -302,8 +597,12 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         # 프로그램 종료 시 voice converter 정리
+        for worker in self.workers:
+            if isinstance(worker, StartWorker):
+                worker.cancel()
+            worker.wait()
         if self.converter:
-            self.stop_voice_conversion()
+            self.stop_voice_conversion(wait=True)
         event.accept()
 
     def _setup_styles(self):
@@ -311,13 +610,20 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + QT_ARGV)
+    log_startup("QApplication created")
+
+    # 창을 만들기 전에 모델 로드 및 워밍업을 백그라운드에서 시작
+    model_loader = ModelLoader(MODEL_PATH)
+    model_loader.start()
+
     app.setStyle("Fusion")
     
     # 어플리케이션 레벨에서 기본 색상 팔레트 설정
     app.setPalette(app.style().standardPalette())
     
-    window = MainWindow()
+    window = MainWindow(model_loader)
     window.show()
+    log_startup("window shown")
     
     sys.exit(app.exec())
\ No newline at end of file
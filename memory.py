@@ -0,0 +1,106 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+MB = 1024 * 1024
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in
+                ('arena', 'ordblks', 'smblks', 'hblks', 'hblkhd', 'usmblks', 'fsmblks', 'uordblks', 'fordblks', 'keepcost')]
+
+
+def _load_mallinfo():
+    # glibc only; torch's CPU allocator and numpy both sit on malloc
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        mallinfo2 = libc.mallinfo2
+    except (OSError, AttributeError, TypeError):
+        return None
+    mallinfo2.restype = _MallInfo2
+    mallinfo2.argtypes = []
+    return mallinfo2
+
+
+_mallinfo2 = _load_mallinfo()
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Peak rather than current, but better than nothing off Linux
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def memory_snapshot():
+    """
+    Process memory in MB: resident set, malloc heap (in use, free but held,
+    mmapped) where glibc reports it, the Python allocator's block count and,
+    while tracemalloc is tracing, Python-allocated memory. All cheap enough
+    to poll every second.
+    """
+    snapshot = {
+        'rss_mb': rss_bytes() / MB,
+        'python_blocks': sys.getallocatedblocks(),
+    }
+    if tracemalloc.is_tracing():
+        snapshot['python_traced_mb'] = tracemalloc.get_traced_memory()[0] / MB
+    if _mallinfo2 is not None:
+        info = _mallinfo2()
+        snapshot['malloc_used_mb'] = info.uordblks / MB
+        snapshot['malloc_free_mb'] = info.fordblks / MB
+        snapshot['malloc_mmap_mb'] = info.hblkhd / MB
+    if 'torch' in sys.modules:
+        torch = sys.modules['torch']
+        if torch.cuda.is_initialized():
+            snapshot['cuda_allocated_mb'] = torch.cuda.memory_allocated() / MB
+            snapshot['cuda_reserved_mb'] = torch.cuda.memory_reserved() / MB
+    return snapshot
+
+
+class MemoryGauge:
+    """memory_snapshot(), refreshed at most every `interval` seconds."""
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.last_time = None
+        self.snapshot = None
+
+    def read(self):
+        now = time.monotonic()
+        if self.last_time is None or now - self.last_time >= self.interval:
+            self.snapshot = memory_snapshot()
+            self.last_time = now
+        return self.snapshot
+
+
+def find_growth(times, values, min_growth, warmup=0.1, segments=4, min_growth_ratio=0.05):
+    """
+    Flags steady growth in a sampled metric: after dropping the first
+    `warmup` fraction of samples, the medians of `segments` consecutive
+    slices must strictly increase and the last must exceed the first by
+    both `min_growth` (in the metric's units) and `min_growth_ratio`.
+    Medians keep single spikes (a temporarily large allocation) from
+    counting. Also returns the least-squares slope per hour.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    start = int(len(values) * warmup)
+    times, values = times[start:], values[start:]
+    if len(values) < 2 * segments:
+        return {'growing': False, 'slope_per_hour': None, 'segment_medians': None}
+
+    medians = [float(np.median(part)) for part in np.array_split(values, segments)]
+    growth = medians[-1] - medians[0]
+    growing = all(b > a for a, b in zip(medians, medians[1:])) and \
+        growth > min_growth and growth > min_growth_ratio * abs(medians[0])
+    slope = np.polyfit(times - times[0], values, 1)[0] * 3600 if times[-1] > times[0] else 0.0
+    return {'growing': bool(growing), 'slope_per_hour': float(slope), 'segment_medians': medians}
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class Reblocker:
+    """
+    Regroups audio arriving in blocks of any size (whatever the device
+    callback delivers) into blocks of exactly `size` samples. Incoming
+    samples are copied straight into one preallocated block, so a callback
+    costs a copy of its own samples, not of everything pending; only a
+    completed block is allocated, since the caller keeps it.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.block = np.zeros(size, dtype=np.float32)
+        self.fill = 0
+
+    def push(self, samples):
+        # Returns the blocks `samples` completed, oldest first (usually none or one)
+        blocks = []
+        offset = 0
+        while offset < len(samples):
+            n = min(self.size - self.fill, len(samples) - offset)
+            self.block[self.fill:self.fill + n] = samples[offset:offset + n]
+            self.fill += n
+            offset += n
+            if self.fill == self.size:
+                blocks.append(self.block.copy())
+                self.fill = 0
+        return blocks
+
+    def reset(self):
+        self.fill = 0
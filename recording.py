@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+
+
+class OutputRecorder:
+    """
+    Tees converted audio to a WAV/FLAC file (format from the extension) on a
+    writer thread. write() copies into one of `n_blocks` preallocated blocks
+    of `block_seconds` each and hands full blocks over without waiting; if
+    the disk is so slow that no free block is left, the audio is dropped and
+    counted in `dropped_samples` instead of stalling the caller. The file is
+    flushed every `flush_interval` seconds so a crash loses little.
+    """
+    def __init__(self, path, samplerate, block_seconds=1.0, n_blocks=8, flush_interval=5.0, subtype=None):
+        self.path = path
+        self.samplerate = samplerate
+        self.block_size = int(samplerate * block_seconds)
+        self.flush_interval = flush_interval
+
+        self.free_blocks = deque(np.zeros(self.block_size, dtype=np.float32) for _ in range(n_blocks))
+        self.full_blocks = queue.SimpleQueue()
+        self.block = self.free_blocks.popleft()
+        self.fill = 0
+
+        self.recorded_samples = 0
+        self.dropped_samples = 0
+
+        self.file = sf.SoundFile(path, 'w', samplerate=samplerate, channels=1, subtype=subtype)
+        self.thread = threading.Thread(target=self._write_loop, name='recorder', daemon=True)
+        self.thread.start()
+
+    def write(self, samples):
+        # Called from the producer thread only (processor or pump)
+        samples = np.asarray(samples, dtype=np.float32)
+        while len(samples):
+            if self.block is None:
+                self.block = self._take_block()
+                if self.block is None:
+                    self.dropped_samples += len(samples)
+                    return
+            n = min(len(samples), self.block_size - self.fill)
+            self.block[self.fill:self.fill + n] = samples[:n]
+            self.fill += n
+            samples = samples[n:]
+            if self.fill == self.block_size:
+                self._hand_over()
+
+    def add_silence(self, n):
+        # Gaps in the output (idle mode) are kept so the file stays in real time
+        if n <= 0:
+            return
+        if self.fill:
+            self._hand_over()
+        self.full_blocks.put((None, n))
+
+    def _take_block(self):
+        try:
+            return self.free_blocks.popleft()
+        except IndexError:
+            return None
+
+    def _hand_over(self):
+        self.full_blocks.put((self.block, self.fill))
+        self.block = None
+        self.fill = 0
+
+    def _write_loop(self):
+        zeros = np.zeros(self.block_size, dtype=np.float32)
+        last_flush = time.time()
+        while True:
+            try:
+                block, n = self.full_blocks.get(timeout=self.flush_interval)
+            except queue.Empty:
+                block, n = None, 0
+            else:
+                if block is None and n is None:
+                    break
+                if block is None:
+                    # Silence
+                    while n > 0:
+                        self.file.write(zeros[:min(n, self.block_size)])
+                        self.recorded_samples += min(n, self.block_size)
+                        n -= self.block_size
+                else:
+                    self.file.write(block[:n])
+                    self.recorded_samples += n
+                    self.free_blocks.append(block)
+
+            if time.time() - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = time.time()
+
+        self.file.close()
+
+    def close(self):
+        if self.fill:
+            self._hand_over()
+        self.full_blocks.put((None, None))
+        self.thread.join()
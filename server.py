@@ -0,0 +1,242 @@
+import warnings
+warnings.filterwarnings('ignore')
+
+import argparse
+import asyncio
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core import ChunkProcessor
+from vc import ToneColorConverter
+from vc.resample import StreamResampler
+
+# Wire protocol (all integers little-endian):
+#   client -> server  b'LLAC' + uint32 sample rate, once
+#   both directions   uint32 byte length + float32 mono PCM, repeated
+# The client half-closes its side when done; the server flushes the remaining
+# audio and closes. Converted audio comes back at the client's sample rate.
+MAGIC = b'LLAC'
+HANDSHAKE = struct.Struct('<4sI')
+FRAME_HEADER = struct.Struct('<I')
+MAX_FRAME_BYTES = 1 << 20
+
+
+class ConversionServer:
+    """
+    Serves conversion sessions over TCP. All sessions share one model and one
+    inference thread; each session has its own ChunkProcessor state and a
+    bounded queue of pending chunks. A full queue stops the session's reader,
+    and an unread output stream blocks on drain(), so a slow client only ever
+    pushes back on its own TCP connection.
+    """
+    def __init__(self, converter, target_se, max_pending_chunks=2, write_buffer_bytes=1 << 18, max_sessions=8):
+        self.converter = converter
+        self.target_se = target_se
+        self.max_pending_chunks = max_pending_chunks
+        self.write_buffer_bytes = write_buffer_bytes
+        self.max_sessions = max_sessions
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self.sessions = 0
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    async def handle_client(self, reader, writer):
+        if self.sessions >= self.max_sessions:
+            writer.close()
+            return
+        self.sessions += 1
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_bytes)
+        try:
+            magic, samplerate = HANDSHAKE.unpack(await reader.readexactly(HANDSHAKE.size))
+            if magic != MAGIC:
+                return
+            await ServerSession(self, reader, writer, samplerate).run()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+
+class ServerSession:
+    def __init__(self, server, reader, writer, samplerate):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.processor = ChunkProcessor(server.converter, server.target_se)
+        self.chunks = asyncio.Queue(maxsize=server.max_pending_chunks)
+
+        rate = self.processor.RATE
+        self.input_resampler = StreamResampler(samplerate, rate) if samplerate != rate else None
+        self.output_resampler = StreamResampler(rate, samplerate) if samplerate != rate else None
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    async def run(self):
+        # The first chunk only serves as left context; start with silence so the
+        # output covers the client's audio from its first sample
+        await self.chunks.put(self.processor.SILENCE_CHUNK)
+        self.writer_task = asyncio.create_task(self._convert_loop())
+        try:
+            await self._read_loop()
+            await self._put(None)
+            await self.writer_task
+        finally:
+            self.writer_task.cancel()
+
+    async def _put(self, chunk):
+        # Waits for queue space, unless the convert loop has ended (the client
+        # went away): nothing would ever make room then
+        put = asyncio.ensure_future(self.chunks.put(chunk))
+        await asyncio.wait({put, self.writer_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            self.writer_task.result()
+            raise ConnectionError("Session output closed")
+
+    async def _read_loop(self):
+        chunk_size = self.processor.CHUNK
+        while True:
+            try:
+                header = await self.reader.readexactly(FRAME_HEADER.size)
+            except asyncio.IncompleteReadError:
+                break
+            (size,) = FRAME_HEADER.unpack(header)
+            if size > MAX_FRAME_BYTES or size % 4:
+                raise ConnectionError(f"Bad frame size {size}")
+            samples = np.frombuffer(await self.reader.readexactly(size), dtype='<f4').astype(np.float32)
+
+            if self.input_resampler is not None:
+                samples = self.input_resampler.process(samples)
+            self.pending = np.concatenate([self.pending, samples])
+            while len(self.pending) >= chunk_size:
+                # Blocks while the session is behind, which stops reading the socket
+                await self._put(self.pending[:chunk_size].copy())
+                self.pending = self.pending[chunk_size:]
+
+        # Flush: pad the tail to a full chunk, then one silent chunk of right context
+        tail = np.zeros(chunk_size, dtype=np.float32)
+        tail[:len(self.pending)] = self.pending
+        await self._put(tail)
+        await self._put(self.processor.SILENCE_CHUNK)
+
+    async def _convert_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await self.chunks.get()
+            if chunk is None:
+                break
+            output = await loop.run_in_executor(self.server.executor, self.processor.process, chunk, self.chunks.qsize())
+            if output is None:
+                continue
+            if self.output_resampler is not None:
+                output = self.output_resampler.process(output)
+            self.writer.write(FRAME_HEADER.pack(output.nbytes) + output.astype('<f4').tobytes())
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                # Client gone; the reader stops at its next _put()
+                return
+
+        if self.writer.can_write_eof():
+            self.writer.write_eof()
+
+
+async def stream_audio(host, port, audio, samplerate, frame_size=1024, realtime=False):
+    """
+    Client side: streams `audio` to a server and returns the converted audio.
+    With `realtime` the frames are paced at the audio's own rate.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(HANDSHAKE.pack(MAGIC, samplerate))
+
+    async def send():
+        for start in range(0, len(audio), frame_size):
+            frame = np.asarray(audio[start:start + frame_size], dtype='<f4')
+            writer.write(FRAME_HEADER.pack(frame.nbytes) + frame.tobytes())
+            await writer.drain()
+            if realtime:
+                await asyncio.sleep(len(frame) / samplerate)
+        writer.write_eof()
+
+    async def receive():
+        frames = []
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER.size)
+            except asyncio.IncompleteReadError:
+                break
+            (size,) = FRAME_HEADER.unpack(header)
+            frames.append(np.frombuffer(await reader.readexactly(size), dtype='<f4'))
+        return np.concatenate(frames) if frames else np.zeros(0, dtype=np.float32)
+
+    _, output = await asyncio.gather(send(), receive())
+    writer.close()
+    return output
+
+
+def run_loopback(converter, target_se, audio, samplerate, realtime=False):
+    """
+    Starts a server on the loopback interface, streams `audio` through it with
+    the client above and returns the converted audio. No network access needed.
+    """
+    async def run():
+        server = ConversionServer(converter, target_se)
+        host, port = await server.start('127.0.0.1', 0)
+        try:
+            return await stream_audio(host, port, audio, samplerate, realtime=realtime)
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming voice conversion server")
+    parser.add_argument('--model', default='vc/model.pth')
+    parser.add_argument('--target', default='samples/tsu.wav')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--loopback', metavar='WAV', help="Convert a file through a local server and exit")
+    parser.add_argument('--output', default='loopback_output.wav')
+    args = parser.parse_args()
+
+    converter = ToneColorConverter(ckpt_path=args.model, device=args.device)
+    target_se = converter.extract_target_se(args.target)
+
+    if args.loopback:
+        import soundfile as sf
+        audio, samplerate = sf.read(args.loopback, dtype='float32')
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        start_time = time.time()
+        output = run_loopback(converter, target_se, audio, samplerate)
+        print(f"Converted {len(audio) / samplerate:.1f}s of audio in {time.time() - start_time:.1f}s")
+        sf.write(args.output, output, samplerate)
+        return
+
+    async def serve():
+        server = ConversionServer(converter, target_se)
+        host, port = await server.start(args.host, args.port)
+        print(f"Listening on {host}:{port}")
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
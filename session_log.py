@@ -0,0 +1,262 @@
+import warnings
+warnings.filterwarnings('ignore')
+
+import argparse
+import json
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Session log layout (little-endian):
+#   header   b'LLSL' + uint16 version + uint32 model rate + uint32 chunk size
+#            + uint32 hop (0 unless the session ran in overlap-add mode)
+#            + uint32 speculative lookahead (0 unless it ran in speculative mode)
+#   records  1-byte kind + float64 seconds since the session started, then
+#     b'T'   uint32 count + float32[count]       target speaker embedding
+#     b'I'   uint16 backlog + uint32 drops + float32[hop or chunk]   accepted input
+#     b'S'   float32 wait + float32 process time + uint16 backlog
+#            + uint8 is_speech + uint8 quality tier           one emitted chunk
+#     b'W'   uint32 count + float32[count]   leaving idle mode, the window
+#            restarts seeded with this context
+MAGIC = b'LLSL'
+VERSION = 3
+FILE_HEADER = struct.Struct('<4sHIIII')
+RECORD_HEADER = struct.Struct('<cd')
+TARGET = struct.Struct('<I')
+INPUT = struct.Struct('<HI')
+STEP = struct.Struct('<ffHBB')
+
+
+class SessionRecorder:
+    """
+    Opt-in capture of what the realtime pipeline saw: every accepted input
+    chunk, the target embedding, queue depths and per-step timings. The
+    record_* calls only enqueue; packing and disk I/O happen on a writer
+    thread. If the writer falls behind by more than `max_pending` records,
+    new records are counted in `lost_records` and discarded rather than
+    stalling the caller.
+    """
+    def __init__(self, path, samplerate, chunk, hop=None, speculative_lookahead=None, max_pending=256):
+        self.path = path
+        self.chunk = chunk
+        self.records = queue.Queue(maxsize=max_pending)
+        self.lost_records = 0
+        self.start_time = time.perf_counter()
+
+        self.file = open(path, 'wb', buffering=1 << 20)
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, samplerate, chunk, hop or 0, speculative_lookahead or 0))
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def _put(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.lost_records += 1
+
+    def _now(self):
+        return time.perf_counter() - self.start_time
+
+    def record_target(self, target_se):
+        se = target_se.detach().cpu().numpy() if hasattr(target_se, 'detach') else target_se
+        self._put((b'T', self._now(), np.asarray(se, dtype=np.float32).reshape(-1).copy()))
+
+    def record_input(self, chunk, backlog, drops):
+        # `chunk` must not be modified afterwards; the pipeline never reuses input chunks
+        self._put((b'I', self._now(), chunk, backlog, drops))
+
+    def record_step(self, wait, process_time, backlog, is_speech, quality):
+        self._put((b'S', self._now(), wait, process_time, backlog, is_speech, quality))
+
+    def record_wake(self, context):
+        self._put((b'W', self._now(), np.asarray(context, dtype=np.float32)))
+
+    def _write_loop(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                break
+            kind, timestamp = record[:2]
+            self.file.write(RECORD_HEADER.pack(kind, timestamp))
+            if kind in (b'T', b'W'):
+                self.file.write(TARGET.pack(len(record[2])) + record[2].astype('<f4').tobytes())
+            elif kind == b'I':
+                _, _, chunk, backlog, drops = record
+                self.file.write(INPUT.pack(min(backlog, 0xFFFF), drops) + np.asarray(chunk, dtype='<f4').tobytes())
+            else:
+                _, _, wait, process_time, backlog, is_speech, quality = record
+                self.file.write(STEP.pack(wait, process_time, min(backlog, 0xFFFF), bool(is_speech), quality))
+
+    def close(self):
+        self.records.put(None)
+        self.thread.join()
+        self.file.close()
+
+
+def read_session(path):
+    """
+    Returns (samplerate, chunk, hop, lookahead, records) where hop is None
+    outside overlap-add mode, lookahead is None outside speculative mode
+    and records is a list of ('target', t, se),
+    ('input', t, samples, backlog, drops),
+    ('step', t, wait, process_time, backlog, is_speech, quality) and
+    ('wake', t, context) tuples.
+    A truncated final record (crashed session) is ignored.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = FILE_HEADER.unpack_from(data, 0)[:2]
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a session log")
+    if version != VERSION:
+        raise ValueError(f"{path} is a version {version} session log, expected {VERSION}")
+    samplerate, chunk, hop, lookahead = FILE_HEADER.unpack_from(data, 0)[2:]
+    step = hop or chunk
+
+    records = []
+    offset = FILE_HEADER.size
+    size = len(data)
+    while offset + RECORD_HEADER.size <= size:
+        kind, timestamp = RECORD_HEADER.unpack_from(data, offset)
+        body = offset + RECORD_HEADER.size
+        if kind in (b'T', b'W'):
+            if body + TARGET.size > size:
+                break
+            (count,) = TARGET.unpack_from(data, body)
+            end = body + TARGET.size + count * 4
+        elif kind == b'I':
+            end = body + INPUT.size + step * 4
+        elif kind == b'S':
+            end = body + STEP.size
+        else:
+            raise ValueError(f"Unknown record {kind!r} at byte {offset}")
+        if end > size:
+            break
+
+        if kind in (b'T', b'W'):
+            values = np.frombuffer(data, dtype='<f4', count=count, offset=body + TARGET.size).astype(np.float32)
+            records.append(('target' if kind == b'T' else 'wake', timestamp, values))
+        elif kind == b'I':
+            backlog, drops = INPUT.unpack_from(data, body)
+            samples = np.frombuffer(data, dtype='<f4', count=step, offset=body + INPUT.size).astype(np.float32)
+            records.append(('input', timestamp, samples, backlog, drops))
+        else:
+            records.append(('step', timestamp) + STEP.unpack_from(data, body))
+        offset = end
+    return samplerate, chunk, hop or None, lookahead or None, records
+
+
+def replay(path, converter, realtime=False, quality=0, cache_margin=None, validate_cache=False, align_splices=False):
+    """
+    Feeds a recorded session through a fresh ChunkProcessor, at the original
+    pace (`realtime`) or as fast as possible. The quality tier is held fixed
+    so runs are comparable across builds; the tiers the live session went
+    through are reported alongside. `cache_margin` and `validate_cache` turn
+    on latent caching (see ChunkProcessor); its reuse and, when validating,
+    its error against full recomputes go in the report. Returns (report,
+    output audio), the audio as [N, samples] for a multi-target session.
+    `align_splices` as in ChunkProcessor.
+    """
+    import torch
+    from core import ChunkProcessor
+
+    samplerate, chunk, hop, lookahead, records = read_session(path)
+    if samplerate != converter.sampling_rate:
+        raise ValueError(f"Session was recorded at {samplerate}Hz, model runs at {converter.sampling_rate}Hz")
+    converter.set_quality(quality)
+
+    processor = None
+    outputs = []
+    replayed_times = []
+    replayed_speech = []
+    recorded_steps = [r for r in records if r[0] == 'step']
+    start_time = time.perf_counter()
+    first_input = None
+
+    for record in records:
+        if record[0] == 'target':
+            # One or several (multi-target) embeddings
+            target_se = torch.from_numpy(record[2]).reshape(-1, converter.hps['model']['gin_channels'], 1).to(converter.device)
+            if processor is None:
+                processor = ChunkProcessor(converter, target_se, chunk=chunk, hop=hop,
+                                           lookahead=lookahead, speculative=lookahead is not None,
+                                           cache_margin=cache_margin, validate_cache=validate_cache,
+                                           align_splices=align_splices)
+            else:
+                processor.target_se = target_se
+        elif record[0] == 'wake' and processor is not None:
+            processor.reset(record[2])
+        elif record[0] == 'input' and processor is not None:
+            if realtime:
+                if first_input is None:
+                    first_input = record[1]
+                delay = start_time + record[1] - first_input - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            output = processor.process(record[2].copy())
+            if output is None:
+                continue
+            outputs.append(output)
+            replayed_times.append(processor.process_times[-1])
+            replayed_speech.append(processor.last_was_speech)
+
+    recorded_times = np.array([r[3] for r in recorded_steps]) * 1000
+    replayed_times = np.array(replayed_times) * 1000
+    n = min(len(recorded_steps), len(replayed_speech))
+    report = {
+        'inputs': sum(1 for r in records if r[0] == 'input'),
+        'emitted': len(outputs),
+        'speech_mismatches': sum(bool(recorded_steps[i][5]) != bool(replayed_speech[i]) for i in range(n)),
+        'recorded_ms': _summary(recorded_times),
+        'replayed_ms': _summary(replayed_times),
+        'recorded_max_backlog': max((r[3] for r in records if r[0] == 'input'), default=0),
+        'recorded_drops': max((r[4] for r in records if r[0] == 'input'), default=0),
+        'recorded_quality_tiers': sorted({r[6] for r in recorded_steps}),
+        'wall_time_s': time.perf_counter() - start_time,
+    }
+    if processor is not None and processor.latent_cache is not None:
+        report['latent_cache'] = processor.latent_cache.stats()
+    output = np.concatenate(outputs, axis=-1) if outputs else np.zeros(0, dtype=np.float32)
+    return report, output
+
+
+def _summary(times):
+    if len(times) == 0:
+        return None
+    return {
+        'mean': float(times.mean()),
+        'p95': float(np.percentile(times, 95)),
+        'max': float(times.max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded conversion session")
+    parser.add_argument('session')
+    parser.add_argument('--model', default='vc/model.pth')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--realtime', action='store_true', help="Keep the recorded pacing instead of running flat out")
+    parser.add_argument('--quality', type=int, default=0)
+    parser.add_argument('--output', help="Write the replayed output to this WAV file")
+    parser.add_argument('--cache-latents', type=int, metavar='MARGIN', help="Reuse source latents across windows, recomputing MARGIN frames either side")
+    parser.add_argument('--validate-cache', action='store_true', help="Also run every window in full and report the cached latents' error")
+    parser.add_argument('--align-splices', action='store_true', help="Splice chunks at the best-correlated offset")
+    args = parser.parse_args()
+
+    from vc import ToneColorConverter
+    converter = ToneColorConverter(ckpt_path=args.model, device=args.device)
+    converter.warmup()
+    report, output = replay(args.session, converter, realtime=args.realtime, quality=args.quality,
+                            cache_margin=args.cache_latents, validate_cache=args.validate_cache, align_splices=args.align_splices)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        import soundfile as sf
+        # One channel per target voice
+        sf.write(args.output, output.T, converter.sampling_rate)
+
+if __name__ == "__main__":
+    main()
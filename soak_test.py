@@ -0,0 +1,132 @@
+import warnings
+warnings.filterwarnings('ignore')
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from backends import VirtualAudioDevice
+from core import RealtimeVoiceConverter
+from latency_harness import burst_train
+from memory import find_growth, memory_snapshot
+from vc import ToneColorConverter
+
+# Growth worth flagging over a run, per metric (MB unless noted)
+MIN_GROWTH = {
+    'rss_mb': 16.0,
+    'malloc_used_mb': 16.0,
+    'malloc_free_mb': 16.0,
+    'malloc_mmap_mb': 16.0,
+    'python_traced_mb': 4.0,
+    'python_blocks': 20000,
+    'cuda_allocated_mb': 16.0,
+    'cuda_reserved_mb': 16.0,
+}
+
+
+def run_soak(converter, target_se, duration, interval=10.0, samplerate=48000, speed=1.0, model_path=None, log=print, **converter_options):
+    """
+    Runs the realtime pipeline on a looped burst train for `duration`
+    seconds of wall time, sampling memory_snapshot() (and the inference
+    process's, when isolated) every `interval` seconds. Returns a report
+    with the samples and, per metric, find_growth()'s verdict.
+    """
+    source, _ = burst_train(samplerate, duration=20.0)
+    device = VirtualAudioDevice(source, samplerate, speed=speed, loop=True, capture=False)
+    rvc = RealtimeVoiceConverter(
+        model_path=model_path,
+        converter=converter,
+        target_se=target_se,
+        backend=device,
+        samplerate=samplerate,
+        **converter_options
+    )
+
+    samples = []
+    worker_samples = []
+    start_time = time.monotonic()
+    rvc.start()
+    try:
+        while True:
+            elapsed = time.monotonic() - start_time
+            snapshot = memory_snapshot()
+            samples.append(dict(snapshot, t=elapsed))
+            if rvc.isolate and rvc.processor.memory is not None:
+                worker_samples.append(dict(rvc.processor.memory, t=elapsed))
+            stats = rvc.get_stats()
+            log(f"[{elapsed:7.0f}s] rss {snapshot['rss_mb']:.1f}MB  chunks {stats['processed_chunks']}  "
+                f"dropped {stats['dropped_frames']}  underruns {stats['underruns']}")
+            if elapsed >= duration:
+                break
+            time.sleep(min(interval, max(0.0, duration - elapsed)))
+    finally:
+        rvc.stop()
+
+    report = {
+        'duration_s': time.monotonic() - start_time,
+        'interval_s': interval,
+        'processed_chunks': rvc.processor.process_count,
+        'dropped_frames': rvc.drop_count,
+        'underruns': rvc.jitter_buffer.underruns,
+        'growth': _growth(samples),
+        'samples': samples,
+    }
+    if worker_samples:
+        report['worker_growth'] = _growth(worker_samples)
+        report['worker_samples'] = worker_samples
+    report['growing'] = sorted(
+        [metric for metric, g in report['growth'].items() if g['growing']] +
+        [f"worker.{metric}" for metric, g in report.get('worker_growth', {}).items() if g['growing']]
+    )
+    return report
+
+
+def _growth(samples):
+    times = [s['t'] for s in samples]
+    return {
+        metric: find_growth(times, [s[metric] for s in samples], MIN_GROWTH.get(metric, 16.0))
+        for metric in samples[0] if metric != 't'
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-run memory soak test on synthetic input")
+    parser.add_argument('--model', default='vc/model.pth')
+    parser.add_argument('--target', default='samples/tsu.wav')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--duration', type=float, default=3600.0, help="Wall-clock seconds to run")
+    parser.add_argument('--interval', type=float, default=10.0, help="Seconds between memory samples")
+    parser.add_argument('--samplerate', type=int, default=48000)
+    parser.add_argument('--speed', type=float, default=1.0, help="Clock speed relative to real time")
+    parser.add_argument('--hop', type=int, help="Overlap-add hop in model-rate samples (default: whole chunks)")
+    parser.add_argument('--speculative', action='store_true')
+    parser.add_argument('--isolate', action='store_true', help="Run inference in a separate process")
+    parser.add_argument('--tracemalloc', action='store_true', help="Also trace Python allocations (slower)")
+    parser.add_argument('--output', help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    converter = ToneColorConverter(ckpt_path=args.model, device=args.device)
+    target_se = converter.extract_target_se(args.target)
+
+    report = run_soak(
+        converter, target_se, args.duration,
+        interval=args.interval,
+        samplerate=args.samplerate,
+        speed=args.speed,
+        model_path=args.model,
+        isolate=args.isolate,
+        hop=args.hop,
+        speculative=args.speculative
+    )
+    summary = {key: value for key, value in report.items() if not key.endswith('samples')}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print("GROWTH: " + ", ".join(report['growing']) if report['growing'] else "No steady growth")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import copy
+
+import torch
+
+from vc import ToneColorConverter
+from vc.checkpoint import load_flat, save_flat
+from vc.golden import random_converter
+
+
+def test_flat_checkpoint_loads_silently_and_exactly(tmp_path, capsys):
+    converter = random_converter(seed=0)
+    model = copy.deepcopy(converter.model)
+    model.remove_weight_norm()
+    path = str(tmp_path / 'model.safetensors')
+    save_flat(model.state_dict(), path)
+    capsys.readouterr()
+
+    loaded = ToneColorConverter(ckpt_path=path)
+    assert capsys.readouterr().out == ''
+
+    expected = model.state_dict()
+    state = loaded.model.state_dict()
+    assert state.keys() == expected.keys() == load_flat(path).keys()
+    for name, tensor in expected.items():
+        assert torch.equal(state[name], tensor), name
+
+    wav = torch.randn(9984, generator=torch.Generator().manual_seed(0)).numpy()
+    spec = converter.get_spec(wav=wav)
+    target_se = converter.model.extract_se(spec)
+    with torch.no_grad():
+        assert torch.equal(loaded.model(spec, target_se, tau=0.0), converter.model(spec, target_se, tau=0.0))
@@ -0,0 +1,194 @@
+import numpy as np
+import pytest
+import torch
+
+from core import ChunkProcessor
+
+CHUNK = 1000
+
+
+def target(gain):
+    return torch.full((1, 256, 1), gain)
+
+
+def noise(n, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, n).astype(np.float32)
+
+
+def feed(processor, x, step):
+    outputs = [processor.process(x[i:i + step]) for i in range(0, len(x), step)]
+    return [out for out in outputs if out is not None]
+
+
+def delayed(x, delay):
+    return np.concatenate([np.zeros(delay, dtype=np.float32), x[:len(x) - delay]])
+
+
+def test_overlap_add_reproduces_the_input_one_lookahead_and_hop_late(identity_converter):
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, hop=250)
+    x = noise(20 * 250)
+    out = np.concatenate(feed(processor, x, 250))
+    np.testing.assert_allclose(out, delayed(x, processor.LOOKAHEAD + 250), atol=1e-6)
+
+
+def test_overlap_add_blends_frames_with_sin2_cos2_fades(identity_converter):
+    hop = 250
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, hop=hop)
+    x = noise(20 * hop)
+    feed(processor, x[:10 * hop], hop)
+
+    # The next hop's output is half converted at the old gain, half at the new
+    processor.target_se = target(0.5)
+    out = processor.process(x[10 * hop:11 * hop])
+    played = delayed(x, processor.LOOKAHEAD + hop)[10 * hop:11 * hop]
+    np.testing.assert_allclose(out, played * (processor.ola_fade_out + 0.5 * processor.ola_fade_in), atol=1e-6)
+    np.testing.assert_allclose(processor.ola_fade_in + processor.ola_fade_out, 1, atol=1e-6)
+
+
+def test_overlap_add_silences_after_one_trailing_frame(identity_converter):
+    hop = 250
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, hop=hop)
+    x = np.concatenate([noise(10 * hop), np.zeros(20 * hop, dtype=np.float32)])
+    out = np.concatenate(feed(processor, x, hop))
+    speech_end = 10 * hop + processor.LOOKAHEAD + hop
+    np.testing.assert_allclose(out[:speech_end], delayed(x, processor.LOOKAHEAD + hop)[:speech_end], atol=1e-6)
+    np.testing.assert_array_equal(out[speech_end:], 0)
+    assert not processor.last_was_speech
+
+
+def test_overlap_add_reset_continues_from_the_context(identity_converter):
+    hop = 250
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, hop=hop)
+    feed(processor, noise(10 * hop, seed=1), hop)
+
+    context = noise(processor.context_size, seed=2)
+    x = noise(10 * hop, seed=3)
+    processor.reset(context)
+    out = np.concatenate(feed(processor, x, hop))
+
+    # Nothing carries over: the first hop fades in from silence, then the
+    # output is the context followed by the new input
+    stream = np.concatenate([context, x])[len(context) - processor.LOOKAHEAD - hop:]
+    np.testing.assert_allclose(out[:hop], stream[:hop] * processor.ola_fade_in, atol=1e-6)
+    np.testing.assert_allclose(out[hop:], stream[hop:len(out)], atol=1e-6)
+
+
+def crossfaded(prev_end, chunk):
+    # What apply_short_crossfade makes of the head of `chunk`
+    n = len(prev_end)
+    fade_in = np.sin(np.linspace(0, np.pi / 2, n)) ** 2
+    fade_out = np.cos(np.linspace(0, np.pi / 2, n)) ** 2
+    out = chunk.copy()
+    out[:n] = prev_end * fade_out + chunk[:n] * fade_in
+    return out
+
+
+def test_speculative_emits_a_lookahead_early_and_revises_the_previous_chunk(identity_converter):
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, speculative=True)
+    lookahead = processor.LOOKAHEAD
+    x = noise(8 * CHUNK)
+    outputs = []
+    revisions = []
+    for i in range(0, len(x), CHUNK):
+        out = processor.process(x[i:i + CHUNK])
+        if out is not None:
+            outputs.append(out)
+            revisions.append(processor.revision)
+
+    # The k-th chunk out ends `lookahead` before the newest input
+    expected = [x[(k + 2) * CHUNK - lookahead:(k + 3) * CHUNK - lookahead] for k in range(len(outputs))]
+    for out, want in zip(outputs, expected):
+        np.testing.assert_array_equal(out, want)
+
+    # Each revision is the previous chunk again, crossfaded against the one
+    # before it as a whole-chunk step would be
+    assert revisions[0] is None
+    np.testing.assert_array_equal(revisions[1], expected[0])
+    for k in range(2, len(revisions)):
+        np.testing.assert_allclose(revisions[k], crossfaded(expected[k - 2][-processor.CROSSFADE_SIZE:], expected[k - 1]), atol=1e-6)
+
+
+def test_speculative_revision_carries_a_target_swap(identity_converter):
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, speculative=True)
+    x = noise(5 * CHUNK)
+    for i in range(0, 4 * CHUNK, CHUNK):
+        previous = processor.process(x[i:i + CHUNK])
+
+    processor.target_se = target(0.5)
+    processor.process(x[4 * CHUNK:])
+    fade = processor.CROSSFADE_SIZE
+    np.testing.assert_allclose(processor.revision[fade:], 0.5 * previous[fade:], atol=1e-6)
+
+
+def test_speculative_silence_has_no_revision(identity_converter):
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, speculative=True)
+    x = np.concatenate([noise(4 * CHUNK), np.zeros(4 * CHUNK, dtype=np.float32)])
+    steps = []
+    for i in range(0, len(x), CHUNK):
+        out = processor.process(x[i:i + CHUNK])
+        if out is not None:
+            steps.append((out, processor.revision))
+
+    # The first silent chunk out is still converted: its revision ends with
+    # the speech that lies within a lookahead of it. After that nothing is
+    # left to revise
+    out, revision = steps[3]
+    np.testing.assert_array_equal(out, 0)
+    assert np.abs(revision).max() > 0
+    for out, revision in steps[4:]:
+        np.testing.assert_array_equal(out, 0)
+        assert revision is None
+
+
+def test_speculative_reset_emits_straight_away_without_a_revision(identity_converter):
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, speculative=True)
+    context = noise(processor.context_size, seed=1)
+    x = noise(CHUNK, seed=2)
+    processor.reset(context)
+    out = processor.process(x)
+    np.testing.assert_array_equal(out, np.concatenate([context, x])[2 * CHUNK - processor.LOOKAHEAD:3 * CHUNK - processor.LOOKAHEAD])
+    assert processor.revision is None
+
+
+class ShiftingConverter:
+    # Wraps the identity converter, moving each conversion by the next of
+    # `shifts` samples: the phase wander that splice alignment follows
+    def __init__(self, converter, shifts):
+        self.converter = converter
+        self.shifts = iter(shifts)
+
+    def __getattr__(self, name):
+        return getattr(self.converter, name)
+
+    def convert(self, src_spec, g_tgt, tau=1.0, source=None):
+        converted, rate = self.converter.convert(src_spec, g_tgt, tau, source)
+        return np.roll(converted, next(self.shifts)), rate
+
+
+def test_aligned_splices_follow_the_conversion_seamlessly(identity_converter):
+    shifts = [0, 40, -30, 90, 10, -60, 0, 25]
+    processor = ChunkProcessor(ShiftingConverter(identity_converter, shifts), target(1.0), chunk=CHUNK, align_splices=True)
+    x = noise((len(shifts) + 2) * CHUNK)
+    out = np.concatenate(feed(processor, x, CHUNK))
+
+    # Each chunk is cut where the previous conversion left off, so the
+    # output is the input played straight through, a chunk late
+    assert len(out) == len(shifts) * CHUNK
+    np.testing.assert_allclose(out, x[CHUNK:len(out) + CHUNK], atol=1e-6)
+
+
+def test_unaligned_splices_crossfade_replayed_audio(identity_converter):
+    processor = ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK)
+    x = noise(5 * CHUNK)
+    outputs = feed(processor, x, CHUNK)
+    fade = processor.CROSSFADE_SIZE
+    np.testing.assert_allclose(outputs[1], crossfaded(x[2 * CHUNK - fade:2 * CHUNK], x[2 * CHUNK:3 * CHUNK]), atol=1e-6)
+
+
+def test_splice_alignment_needs_whole_chunks(identity_converter):
+    with pytest.raises(ValueError):
+        ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, hop=250, align_splices=True)
+    with pytest.raises(ValueError):
+        ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, speculative=True, align_splices=True)
+    with pytest.raises(ValueError):
+        ChunkProcessor(identity_converter, target(1.0), chunk=CHUNK, align_splices=True, splice_lag=CHUNK)
@@ -0,0 +1,43 @@
+import pytest
+import torch
+
+from vc.golden import BACKENDS, DEFAULT_TOLERANCES, compare, generate, make_fixtures, random_converter
+from vc.library import stack_se
+from vc.metrics import stage_metrics
+
+
+@pytest.fixture(scope='module')
+def converter():
+    return random_converter(seed=0)
+
+
+@pytest.fixture(scope='module')
+def golden(converter):
+    return generate(converter)
+
+
+def test_random_model_exercises_every_stage(golden):
+    stages = golden['fixtures']['voiced']['stages']
+    assert all(torch.isfinite(stages[name]).all() for name in stages)
+    assert stage_metrics(stages['z'], stages['z_p'])['snr_db'] < DEFAULT_TOLERANCES['z_p']
+    assert stages['audio'].abs().max() > 0
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_backend_matches_golden(converter, golden, backend):
+    passed, results = compare(golden, converter, backend)
+    assert passed, results
+
+
+def test_multi_target_matches_single(converter):
+    fixtures = make_fixtures(converter.sampling_rate)
+    with torch.no_grad():
+        targets = [converter.model.extract_se(converter.get_spec(wav=fixtures[name])) for name in ('target', 'noisy')]
+    spec = converter.get_spec(wav=fixtures['voiced'])
+    source = converter.model.encode_source(spec, tau=0.0)
+
+    batched, _ = converter.convert_multi(spec, stack_se(*targets), tau=0.0, source=source)
+    for i, target_se in enumerate(targets):
+        single, _ = converter.convert(spec, target_se, tau=0.0, source=source)
+        snr = stage_metrics(torch.from_numpy(single.reshape(-1)), torch.from_numpy(batched[i]))['snr_db']
+        assert snr >= DEFAULT_TOLERANCES['audio']
@@ -0,0 +1,136 @@
+import numpy as np
+
+from jitter import JitterBuffer
+
+RATE = 8000
+
+
+def ramp(n, start=0):
+    return ((start + np.arange(n)) / 100000).astype(np.float32)
+
+
+def tone(n, period=40):
+    return (0.5 * np.sin(2 * np.pi * np.arange(n) / period)).astype(np.float32)
+
+
+def test_playback_starts_after_target_latency_with_a_fade_in():
+    jb = JitterBuffer(RATE, target_latency=0.01)
+    x = ramp(1000)
+    jb.write(x)
+    out = jb.read(300)
+
+    lead = jb.base_target
+    fade = jb.fade_size
+    np.testing.assert_array_equal(out[:lead], 0)
+    np.testing.assert_allclose(out[lead:lead + fade], x[:fade] * jb.fade_in)
+    np.testing.assert_array_equal(out[lead + fade:], x[fade:300 - lead])
+    assert jb.fill == 1000 - (300 - lead)
+
+
+def test_read_before_any_write_is_silent():
+    jb = JitterBuffer(RATE)
+    np.testing.assert_array_equal(jb.read(256), 0)
+    assert jb.underruns == 0
+
+
+def test_underrun_repeats_the_last_period_with_decaying_gain():
+    jb = JitterBuffer(RATE, target_latency=0.0, max_conceal=0.1)
+    x = tone(2000)
+    jb.write(x)
+    jb.read(2000)
+
+    concealed = np.concatenate([jb.read(100) for _ in range(3)])
+    expected = tone(2300)[2000:] * np.clip(1 - np.arange(300) / jb.max_conceal, 0, 1)
+    np.testing.assert_allclose(concealed, expected, atol=1e-5)
+    assert jb.underruns == 1
+    assert jb.concealed_samples == 300
+
+
+def test_audio_returning_ends_the_concealment():
+    jb = JitterBuffer(RATE, target_latency=0.0)
+    jb.write(tone(2000))
+    jb.read(2000)
+    jb.read(100)
+
+    jb.write(ramp(500))
+    out = jb.read(500)
+    fade = jb.fade_size
+    np.testing.assert_array_equal(out[fade:], ramp(500)[fade:])
+    assert jb.concealed == 0
+    assert jb.underruns == 1
+
+
+def test_long_underrun_fades_out_and_reprimes():
+    jb = JitterBuffer(RATE, target_latency=0.01, max_conceal=0.05)
+    jb.write(tone(2000))
+    jb.read(2000 + jb.base_target)
+    for _ in range(5):
+        jb.read(100)
+    assert not jb.primed
+    np.testing.assert_array_equal(jb.read(100), 0)
+
+    jb.write(ramp(500))
+    np.testing.assert_array_equal(jb.read(jb.base_target), 0)
+
+
+def test_pause_drains_without_concealing():
+    jb = JitterBuffer(RATE, target_latency=0.0)
+    jb.write(tone(500))
+    jb.pause()
+    jb.read(500)
+    np.testing.assert_array_equal(jb.read(200), 0)
+    assert jb.underruns == 0
+    assert jb.concealed_samples == 0
+
+    jb.resume()
+    jb.write(ramp(300))
+    out = jb.read(300)
+    np.testing.assert_array_equal(out[jb.fade_size:], ramp(300)[jb.fade_size:])
+
+
+def test_excess_latency_is_slipped():
+    jb = JitterBuffer(RATE, target_latency=0.02, slack=0.01, slip_window=0.1)
+    jb.write(ramp(RATE))
+    out = np.concatenate([jb.read(100) for _ in range(10)])
+
+    assert jb.slipped_samples > 0
+    assert jb.fill <= jb.target + jb.slack
+    # The ramp steps by one sample everywhere except across the skip
+    played = out[jb.base_target + jb.fade_size:]
+    steps = np.round(np.diff(played) * 100000).astype(int)
+    assert np.count_nonzero(steps != 1) <= jb.fade_size + 1
+    assert round((played[-1] - played[0]) * 100000) == len(steps) + jb.slipped_samples
+
+
+def test_revise_replaces_only_the_unplayed_part():
+    jb = JitterBuffer(RATE, target_latency=0.0)
+    a = ramp(1000)
+    b = ramp(1000, start=50000)
+    jb.write(a)
+    played = jb.read(300)
+
+    jb.revise(b)
+    rest = jb.read(700)
+    fade = jb.fade_size
+    np.testing.assert_array_equal(played[fade:], a[fade:300])
+    np.testing.assert_allclose(rest[:fade], a[300:300 + fade] * jb.fade_out + b[300:300 + fade] * jb.fade_in)
+    np.testing.assert_array_equal(rest[fade:], b[300 + fade:])
+    assert jb.revised_samples == 700
+
+
+def test_revision_after_playback_is_counted_late():
+    jb = JitterBuffer(RATE, target_latency=0.0)
+    jb.write(ramp(100))
+    jb.read(100)
+    jb.revise(ramp(100, start=500))
+    assert jb.late_revisions == 1
+    assert jb.revised_samples == 0
+
+
+def test_overflow_drops_the_oldest_samples():
+    jb = JitterBuffer(RATE, target_latency=0.0, capacity=0.1)
+    x = ramp(1000)
+    jb.write(x)
+    assert jb.overflow_samples == 200
+    out = jb.read(800)
+    np.testing.assert_array_equal(out[jb.fade_size:], x[200 + jb.fade_size:])
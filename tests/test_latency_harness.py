@@ -0,0 +1,30 @@
+import pytest
+import torch
+
+from latency_harness import burst_train, run_harness
+
+RATE = 22050
+CHUNK = 9984
+
+
+def run_unpaced(converter, **options):
+    source, onsets = burst_train(RATE, duration=8.0)
+    return run_harness(converter, torch.ones(1, 256, 1), source, RATE, onsets, speed=None, adaptive_quality=False, **options)
+
+
+@pytest.mark.parametrize('options, latency', [
+    ({}, 2 * CHUNK / RATE + 0.1),
+    ({'hop': 2496}, (2 * 2496 + CHUNK // 2) / RATE + 0.1),
+])
+def test_unpaced_run_measures_framing_latency(identity_converter, options, latency):
+    report, output = run_unpaced(identity_converter, **options)
+    assert report['overruns'] == 0
+    assert report['underruns'] == 0
+    assert report['onset_latency_ms']['detected'] == report['onset_latency_ms']['expected']
+    assert report['onset_latency_ms']['max'] == pytest.approx(latency * 1000, abs=20)
+    assert report['end_to_end_latency_ms'] == pytest.approx(latency * 1000, abs=20)
+
+
+def test_unpaced_run_rejects_isolated_inference(identity_converter):
+    with pytest.raises(ValueError):
+        run_unpaced(identity_converter, isolate=True)
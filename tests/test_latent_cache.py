@@ -0,0 +1,70 @@
+import pytest
+import torch
+
+from vc.golden import random_converter
+from vc.latent_cache import LatentCache, source_receptive_field
+
+HOP = 256
+
+
+@pytest.fixture(scope='module')
+def converter():
+    return random_converter(seed=0)
+
+
+def windows(converter, n_frames, advance, count):
+    wav = torch.randn((n_frames + advance * count) * HOP, generator=torch.Generator().manual_seed(0)).numpy()
+    for k in range(count):
+        end = (n_frames + advance * k) * HOP
+        yield converter.get_spec(wav=wav[end - n_frames * HOP:end]), end
+
+
+def test_reuse_counts(converter):
+    cache = LatentCache(converter.model, HOP, margin=8)
+    n, advance = 117, 10
+    for spec, end in windows(converter, n, advance, 4):
+        z_p, y_mask = cache.encode(spec, end)
+        assert z_p.shape[-1] == y_mask.shape[-1] == n
+
+    # The first window is computed in full, each later one keeps all but the
+    # new frames and a margin on either side of them
+    keep = n - advance - 8
+    assert cache.reused_frames == 3 * keep
+    assert cache.computed_frames == n + 3 * (n - keep + 8)
+
+
+def test_gap_falls_back_to_a_full_recompute(converter):
+    cache = LatentCache(converter.model, HOP, margin=8)
+    spec, end = next(windows(converter, 117, 10, 1))
+    cache.encode(spec, end)
+    cache.encode(spec, end + HOP // 2)
+    cache.reset()
+    cache.encode(spec, end + 2 * HOP)
+    assert cache.reused_frames == 0
+    assert cache.computed_frames == 3 * 117
+
+
+def test_receptive_field_margin_matches_a_recompute(converter, monkeypatch):
+    # Cached frames keep the source embedding of the window they came from;
+    # pin it so that only the framing is compared
+    model = converter.model
+    with torch.no_grad():
+        g_src = model.extract_se(next(windows(converter, 117, 10, 1))[0])
+    monkeypatch.setattr(model, 'extract_se', lambda spec: g_src)
+
+    field = source_receptive_field(model)
+    n = 4 * field
+    exact = LatentCache(model, HOP, margin=field + 2, validate=True)
+    approximate = LatentCache(model, HOP, margin=8, validate=True)
+    for spec, end in windows(converter, n, 10, 3):
+        z_p, _ = exact.encode(spec, end, tau=0.0)
+        approximate.encode(spec, end, tau=0.0)
+    assert exact.reused_frames > 0
+
+    # Past the window's own left edge (which the recompute sees as padding
+    # and the cached frames don't) the result is a recompute's
+    with torch.no_grad():
+        _, reference, _ = exact._encode(spec, g_src, exact.noise, 0.0)
+    edge = field + 2
+    torch.testing.assert_close(z_p[..., edge:], reference[..., edge:], atol=1e-5, rtol=1e-5)
+    assert approximate.stats()['min_z_p_snr_db'] < exact.stats()['min_z_p_snr_db']
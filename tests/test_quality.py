@@ -0,0 +1,41 @@
+from core import QualityController
+
+
+def make_controller(**options):
+    return QualityController(1.0, n_tiers=4, **options)
+
+
+def test_single_slow_step_keeps_the_tier():
+    controller = make_controller()
+    for load in (0.5, 0.95, 0.5, 0.95, 0.5):
+        assert controller.update(load) == 0
+
+
+def test_sustained_overload_steps_down_one_tier_at_a_time():
+    controller = make_controller(overload_chunks=3)
+    assert [controller.update(0.95) for _ in range(7)] == [0, 0, 1, 1, 1, 2, 2]
+
+
+def test_dropped_input_steps_down_immediately():
+    controller = make_controller()
+    assert controller.update(0.1, dropped=True) == 1
+
+
+def test_backlog_threshold():
+    controller = make_controller(overload_chunks=1, max_backlog=4)
+    assert controller.update(0.1, backlog=4) == 0
+    assert controller.update(0.1, backlog=5) == 1
+
+
+def test_recovers_after_calm_run():
+    controller = make_controller(recover_chunks=3)
+    controller.update(0.1, dropped=True)
+    assert [controller.update(0.2) for _ in range(3)] == [1, 1, 0]
+
+
+def test_middling_load_resets_both_runs():
+    controller = make_controller(overload_chunks=2, recover_chunks=2)
+    controller.update(0.1, dropped=True)
+    assert [controller.update(load) for load in (0.95, 0.6, 0.95, 0.2, 0.6, 0.2)] == [1] * 6
+    assert controller.update(0.9) == 1
+    assert controller.update(0.9) == 2
@@ -0,0 +1,41 @@
+import numpy as np
+
+from reblock import Reblocker
+
+
+def test_any_block_sizes_come_out_in_order_at_the_fixed_size():
+    reblocker = Reblocker(441)
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal(20000).astype(np.float32)
+    cuts = np.sort(rng.integers(0, len(x), 60))
+    blocks = []
+    for piece in np.split(x, cuts):
+        blocks += reblocker.push(piece)
+
+    assert all(len(block) == 441 for block in blocks)
+    n = len(x) // 441 * 441
+    np.testing.assert_array_equal(np.concatenate(blocks), x[:n])
+    assert reblocker.fill == len(x) - n
+
+
+def test_one_push_can_complete_several_blocks():
+    reblocker = Reblocker(100)
+    reblocker.push(np.zeros(30, dtype=np.float32))
+    blocks = reblocker.push(np.arange(250, dtype=np.float32))
+    assert len(blocks) == 2
+    np.testing.assert_array_equal(blocks[1], np.arange(70, 170))
+    assert reblocker.fill == 80
+
+
+def test_returned_blocks_are_not_reused():
+    reblocker = Reblocker(4)
+    first = reblocker.push(np.ones(4, dtype=np.float32))[0]
+    reblocker.push(np.zeros(4, dtype=np.float32))
+    np.testing.assert_array_equal(first, 1)
+
+
+def test_reset_drops_the_partial_block():
+    reblocker = Reblocker(4)
+    reblocker.push(np.ones(3, dtype=np.float32))
+    reblocker.reset()
+    assert reblocker.push(np.arange(4, dtype=np.float32))[0].tolist() == [0, 1, 2, 3]
@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+import soundfile as sf
+
+from recording import OutputRecorder
+
+RATE = 8000
+
+
+class GatedFile:
+    # Holds the writer thread on its first write until the gate opens
+    def __init__(self, file):
+        self.file = file
+        self.gate = threading.Event()
+
+    def write(self, data):
+        self.gate.wait()
+        self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def test_written_audio_and_silence_reach_the_file(tmp_path):
+    path = str(tmp_path / 'out.wav')
+    # Room for everything, so a busy writer thread can't cause drops
+    recorder = OutputRecorder(path, RATE, block_seconds=0.1, n_blocks=64, subtype='FLOAT')
+    rng = np.random.default_rng(0)
+    pieces = [rng.uniform(-0.5, 0.5, rng.integers(1, 2000)).astype(np.float32) for _ in range(20)]
+    for piece in pieces[:10]:
+        recorder.write(piece)
+    recorder.add_silence(1234)
+    for piece in pieces[10:]:
+        recorder.write(piece)
+    recorder.close()
+
+    expected = np.concatenate(pieces[:10] + [np.zeros(1234, dtype=np.float32)] + pieces[10:])
+    data, samplerate = sf.read(path, dtype='float32')
+    assert samplerate == RATE
+    np.testing.assert_array_equal(data, expected)
+    assert recorder.recorded_samples == len(expected)
+    assert recorder.dropped_samples == 0
+
+
+def test_slow_disk_drops_instead_of_blocking(tmp_path):
+    path = str(tmp_path / 'out.flac')
+    recorder = OutputRecorder(path, RATE, block_seconds=0.1, n_blocks=2)
+    gated = GatedFile(recorder.file)
+    recorder.file = gated
+    block = recorder.block_size
+
+    # Both blocks are taken (one held by the stalled writer), the rest is dropped
+    recorder.write(np.full(3 * block, 0.25, dtype=np.float32))
+    assert recorder.dropped_samples == block
+    gated.gate.set()
+    recorder.close()
+
+    data, _ = sf.read(path, dtype='float32')
+    assert len(data) == recorder.recorded_samples == 2 * block
+    np.testing.assert_allclose(data, 0.25, atol=1e-4)
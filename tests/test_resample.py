@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from vc.resample import StreamResampler
+
+
+@pytest.mark.parametrize('rates', [(48000, 22050), (22050, 44100), (44100, 22050)])
+def test_blockwise_resampling_matches_whole_signal(rates):
+    x = np.random.default_rng(0).standard_normal(30000).astype(np.float32)
+    whole = StreamResampler(*rates).process(x)
+
+    resampler = StreamResampler(*rates)
+    sizes = np.random.default_rng(1).integers(1, 2000, size=100)
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    bounds = bounds[bounds < len(x)].tolist() + [len(x)]
+    blocks = [resampler.process(x[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+    np.testing.assert_allclose(np.concatenate(blocks), whole, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('rates', [(48000, 22050), (22050, 44100)])
+def test_output_size_predicts_process(rates):
+    resampler = StreamResampler(*rates)
+    for n in (1, 7, 256, 1000, 4096):
+        expected = resampler.output_size(n)
+        assert len(resampler.process(np.zeros(n, dtype=np.float32))) == expected
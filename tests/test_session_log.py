@@ -0,0 +1,61 @@
+import numpy as np
+import torch
+
+from core import ChunkProcessor
+from session_log import SessionRecorder, read_session, replay
+
+
+def test_session_log_round_trip(tmp_path):
+    path = tmp_path / 'session.lslog'
+    rng = np.random.default_rng(0)
+    target = rng.standard_normal(256).astype(np.float32)
+    chunks = [rng.standard_normal(64).astype(np.float32) for _ in range(3)]
+    context = rng.standard_normal(128).astype(np.float32)
+
+    recorder = SessionRecorder(str(path), 22050, 64)
+    recorder.record_target(target)
+    for i, chunk in enumerate(chunks):
+        recorder.record_input(chunk, backlog=i, drops=0)
+        recorder.record_step(0.5, 0.25, i, True, 1)
+    recorder.record_wake(context)
+    recorder.close()
+
+    samplerate, chunk, hop, lookahead, records = read_session(str(path))
+    assert (samplerate, chunk, hop, lookahead) == (22050, 64, None, None)
+    assert [r[0] for r in records] == ['target'] + ['input', 'step'] * 3 + ['wake']
+    np.testing.assert_array_equal(records[0][2], target)
+    for record, chunk in zip(records[1::2], chunks):
+        np.testing.assert_array_equal(record[2], chunk)
+    assert records[2][2:] == (0.5, 0.25, 0, True, 1)
+    np.testing.assert_array_equal(records[-1][2], context)
+
+
+def test_replay_reproduces_the_live_output(tmp_path, identity_converter):
+    path = str(tmp_path / 'session.lslog')
+    chunk = 9984
+    rng = np.random.default_rng(0)
+    target_se = torch.full((1, 256, 1), 0.5)
+    chunks = [(0.2 * rng.standard_normal(chunk)).astype(np.float32) for _ in range(6)]
+    chunks[3][:] = 0
+    context = (0.2 * rng.standard_normal(2 * chunk)).astype(np.float32)
+
+    live = ChunkProcessor(identity_converter, target_se, chunk=chunk)
+    recorder = SessionRecorder(path, identity_converter.sampling_rate, chunk)
+    recorder.record_target(target_se)
+    expected = []
+    for i, samples in enumerate(chunks):
+        if i == 4:
+            live.reset(context)
+            recorder.record_wake(context)
+        recorder.record_input(samples, backlog=0, drops=0)
+        output = live.process(samples.copy())
+        if output is not None:
+            expected.append(output)
+            recorder.record_step(0.0, live.process_times[-1], 0, live.last_was_speech, 0)
+    recorder.close()
+
+    report, output = replay(path, identity_converter)
+    np.testing.assert_array_equal(output, np.concatenate(expected))
+    assert report['inputs'] == len(chunks)
+    assert report['emitted'] == len(expected)
+    assert report['speech_mismatches'] == 0
@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+
+import numpy as np
+import torch
+
+import vc
+from core import ChunkProcessor
+from worker import InferenceProcess, SharedRing, _worker_main
+
+
+def test_shared_ring_round_trip():
+    ring = SharedRing(capacity=1000)
+    try:
+        attached = SharedRing(name=ring.name)
+        rng = np.random.default_rng(0)
+        written = []
+        read = []
+        for _ in range(50):
+            block = rng.standard_normal(rng.integers(1, 400)).astype(np.float32)
+            if ring.write(block):
+                written.append(block)
+            read.append(attached.read(rng.integers(1, 400)))
+        read.append(attached.read(attached.fill))
+        np.testing.assert_array_equal(np.concatenate(read), np.concatenate(written))
+
+        dropped = ring.dropped
+        assert not ring.write(np.zeros(1001, dtype=np.float32))
+        assert ring.dropped == dropped + 1
+        attached.close()
+    finally:
+        ring.close()
+
+
+
+def test_wake_context_travels_through_the_input_ring(monkeypatch, identity_converter):
+    monkeypatch.setattr(vc, 'ToneColorConverter', lambda ckpt_path, device: identity_converter)
+    chunk, hop = 2048, 512
+    target_se = np.full((1, 256, 1), 0.5, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    before = [rng.standard_normal(hop).astype(np.float32) for _ in range(6)]
+    leftover = rng.standard_normal(hop // 3).astype(np.float32)
+    context = rng.standard_normal(2 * chunk).astype(np.float32)
+    after = [rng.standard_normal(hop).astype(np.float32) for _ in range(6)]
+
+    reference = ChunkProcessor(identity_converter, torch.from_numpy(target_se), chunk=chunk, hop=hop)
+    expected_before = [reference.process(x) for x in before]
+    reference.reset(context)
+    expected_after = [reference.process(x) for x in after]
+    expected = [x * 0.8 for x in expected_before + expected_after if x is not None]
+
+    # The parent side of InferenceProcess, wired to a worker thread
+    proc = InferenceProcess.__new__(InferenceProcess)
+    proc.input_ring = SharedRing(chunk * 4)
+    proc.output_ring = SharedRing(chunk * 16)
+    proc.send_lock = threading.Lock()
+    proc.conn, child_conn = multiprocessing.Pipe()
+    worker = threading.Thread(target=_worker_main, args=(child_conn, None, 'cpu', target_se, chunk, hop, 22050, False,
+                                                         proc.input_ring.name, proc.output_ring.name))
+    worker.start()
+    outputs = []
+
+    def collect(n):
+        while len(outputs) < n:
+            message = proc.conn.recv()
+            if message[0] == 'output':
+                outputs.append(proc.output_ring.read(message[2]))
+
+    try:
+        assert proc.conn.recv() == ('ready',)
+        for x in before:
+            proc.push(x)
+        collect(sum(x is not None for x in expected_before))
+        # A partial hop is still queued when the stream goes idle
+        proc.push(leftover)
+        proc.set_idle(True)
+        proc.set_idle(False, context)
+        for x in after:
+            proc.push(x)
+        collect(len(expected))
+    finally:
+        proc._send(('stop',))
+        worker.join()
+        proc.input_ring.close()
+        proc.output_ring.close()
+
+    assert len(expected) > len(after) // 2
+    for got, want in zip(outputs, expected):
+        np.testing.assert_allclose(got, want, rtol=1e-6)
@@ -0,0 +1,81 @@
+import warnings
+warnings.filterwarnings('ignore')
+
+import argparse
+import time
+
+import torch
+
+from vc import ToneColorConverter
+from vc.modules import PolyphaseConvTranspose1d
+
+
+def time_call(fn, x, repeats):
+    fn(x)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(x)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, sorted(times)[len(times) // 2] * 1000
+
+
+def benchmark_upsampling(converter, window, repeats=20):
+    """
+    Times every Generator upsampling layer, stock ConvTranspose1d against its
+    polyphase rewrite, on inputs shaped like a `window`-sample conversion.
+    Returns one dict per layer.
+    """
+    hps = converter.hps['data']
+    dec = converter.model.dec
+    # get_spec pads the wav, so a window gives one frame per hop
+    length = window // hps['hop_length']
+    results = []
+    with torch.no_grad():
+        for i, layer in enumerate(dec.ups):
+            x = torch.randn(1, layer.in_channels, length, device=converter.device)
+            polyphase = PolyphaseConvTranspose1d(layer)
+            stock_min, stock_median = time_call(layer, x, repeats)
+            poly_min, poly_median = time_call(polyphase, x, repeats)
+            results.append({
+                'layer': i,
+                'shape': f"{layer.in_channels}x{length} -> {layer.out_channels}x{length * layer.stride[0]}",
+                'stride': layer.stride[0],
+                'kernel': layer.kernel_size[0],
+                'stock_ms': stock_median,
+                'polyphase_ms': poly_median,
+                'stock_min_ms': stock_min,
+                'polyphase_min_ms': poly_min,
+                'max_abs_error': (layer(x) - polyphase(x)).abs().max().item(),
+            })
+            length *= layer.stride[0]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-layer timing of the polyphase upsampling rewrite")
+    parser.add_argument('--model', default='vc/model.pth')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--window', type=int, action='append', help="Window size in samples (default: 1 and 3 chunks)")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--threads', type=int, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    converter = ToneColorConverter(ckpt_path=args.model, device=args.device)
+    for window in args.window or [9984, 3 * 9984]:
+        print(f"window {window} samples (median of {args.repeats}, ms)")
+        print(f"  {'layer':<6}{'shape':<26}{'s/k':<7}{'stock':>9}{'polyphase':>11}{'speedup':>9}{'max err':>10}")
+        results = benchmark_upsampling(converter, window, args.repeats)
+        for r in results:
+            print(f"  {r['layer']:<6}{r['shape']:<26}{r['stride']}/{r['kernel']:<5}{r['stock_ms']:>9.2f}"
+                  f"{r['polyphase_ms']:>11.2f}{r['stock_ms'] / r['polyphase_ms']:>8.2f}x{r['max_abs_error']:>10.1e}")
+        stock = sum(r['stock_ms'] for r in results)
+        polyphase = sum(r['polyphase_ms'] for r in results)
+        faster = [r['layer'] for r in results if r['polyphase_ms'] < r['stock_ms']]
+        print(f"  {'total':<39}{stock:>9.2f}{polyphase:>11.2f}{stock / polyphase:>8.2f}x")
+        print(f"  faster as polyphase: layers {faster}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,35 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
 import torch
+from torch.nn import functional as F
 from vc.models import SynthesizerTrn
+from vc.checkpoint import find_flat_checkpoint, is_flat_checkpoint, load_flat, strip_weight_norm
+from vc.resample import StreamResampler, get_resampler
 import torchaudio
-from torchaudio.transforms import Resample as AudioResample
+
+
+# Speed/quality tiers, best first. `resblock_kernels` indexes resblock_kernel_sizes
+# (3, 7, 11) and `n_flows` is the number of coupling layers run in each direction.
+QUALITY_TIERS = [
+    {"name": "high", "resblock_kernels": (0, 1, 2), "n_flows": 4},
+    {"name": "medium", "resblock_kernels": (0, 1), "n_flows": 4},
+    {"name": "low", "resblock_kernels": (1,), "n_flows": 2},
+    {"name": "lowest", "resblock_kernels": (0,), "n_flows": 1},
+]
+
+# References longer than this are embedded segment by segment (extract_se_chunked)
+CHUNKED_SE_SECONDS = 60.0
 
 
 class ToneColorConverter:
-    def __init__(self, ckpt_path, device='cpu'):
+    def __init__(self, ckpt_path, device='cpu', prefer_flat=True, fuse_resblocks=False, polyphase_upsampling=False):
+        # ckpt_path=None keeps the initial (caller-seeded) weights, e.g. for vc.golden
+        if prefer_flat and ckpt_path is not None:
+            ckpt_path = find_flat_checkpoint(ckpt_path)
+
         hps = {
             "data": {
                 "sampling_rate": 22050,
@@ -30,13 +54,37 @@ class ToneColorConverter:
             }
         }
 
-        model = SynthesizerTrn(**hps['model'], **hps['data']).to(device)
+        if ckpt_path is not None and is_flat_checkpoint(ckpt_path):
+            # Inference-ready checkpoint: weight norm is folded in the file, so
+            # drop it (unfolded) to match the parameter names, then point the
+            # parameters at the memory-mapped tensors instead of copying into them
+            with torch.no_grad():
+                model = strip_weight_norm(SynthesizerTrn(**hps['model'], **hps['data']))
+            model.load_state_dict(load_flat(ckpt_path), assign=True)
+            model = model.to(device)
+        else:
+            # Built without autograd: weight norm's derived weights are then
+            # plain tensors, so the model can be deep-copied (vc.golden)
+            with torch.no_grad():
+                model = SynthesizerTrn(**hps['model'], **hps['data']).to(device)
         model.eval()
         self.model = model
         self.hps = hps
         self.device = device
         self.sampling_rate = self.hps['data']['sampling_rate']
+        self.quality = 0
 
+        if ckpt_path is not None and not is_flat_checkpoint(ckpt_path):
+            self.load_quantized_checkpoint(ckpt_path)
+        # After loading: both decoder rewrites snapshot the weights.
+        # `polyphase_upsampling` is True or a list of upsampling layer indices
+        if fuse_resblocks:
+            self.model.dec.fuse_resblocks()
+        if polyphase_upsampling:
+            self.model.dec.polyphase_upsampling(None if polyphase_upsampling is True else polyphase_upsampling)
+
+
+    def load_quantized_checkpoint(self, ckpt_path):
         model_dict = torch.load(ckpt_path, map_location=torch.device('cpu'))
 
         dequantized_dict = {}
@@ -52,6 +100,26 @@ class ToneColorConverter:
         self.model.load_state_dict(dequantized_dict, strict=False)
 
 
+    def warmup(self, n_samples=29952):
+        # Run one conversion on silence so the first real chunk doesn't pay for
+        # lazy initialization (scripted kernels, allocator, thread pools)
+        wav = torch.zeros(1, n_samples, device=self.device)
+        hps = self.hps
+        with torch.no_grad():
+            spec = self.spectrogram_torch(wav, hps['data']['filter_length'],
+                                          hps['data']['sampling_rate'], hps['data']['hop_length'], hps['data']['win_length'],
+                                          center=False)
+            self.model(src_spec=spec, g_tgt=self.model.extract_se(spec))
+
+
+    def set_quality(self, tier):
+        tier = max(0, min(tier, len(QUALITY_TIERS) - 1))
+        self.model.dec.set_active_kernels(QUALITY_TIERS[tier]['resblock_kernels'])
+        self.model.flow.set_active_flows(QUALITY_TIERS[tier]['n_flows'])
+        self.quality = tier
+        return tier
+
+
     def dequantize_tensor(self, quantized, scale, zero_point):
         return scale * quantized.float() + zero_point
     
@@ -70,7 +138,7 @@ class ToneColorConverter:
         audio, sr = torchaudio.load(fpath)
         
         if sr != self.sampling_rate:
-            audio = AudioResample(orig_freq=sr, new_freq=self.sampling_rate)(audio)
+            audio = get_resampler(sr, self.sampling_rate)(audio)
 
         if audio.shape[0] != desired_channels:
             audio = audio.mean(dim=0, keepdim=True)
@@ -114,7 +182,133 @@ class ToneColorConverter:
         return y
     
     
-    def convert(self, src_spec, g_tgt):
+    def iter_speech_segments(self, fpath, segment_seconds=10.0, vad_threshold=0.01, frame_seconds=0.02, block_seconds=5.0, min_segment_seconds=1.0):
+        """
+        Streams a file block by block and yields mono, model-rate segments of
+        `segment_seconds` made of voiced frames only (mean |x| above
+        `vad_threshold`). Memory use is bounded by one block plus one segment,
+        whatever the length of the file.
+        """
+        info = sf.info(fpath)
+        resampler = StreamResampler(info.samplerate, self.sampling_rate) if info.samplerate != self.sampling_rate else None
+        frame_size = int(self.sampling_rate * frame_seconds)
+        segment_size = int(self.sampling_rate * segment_seconds)
+
+        segment = np.empty(segment_size, dtype=np.float32)
+        filled = 0
+        carry = np.zeros(0, dtype=np.float32)
+        for block in sf.blocks(fpath, blocksize=int(info.samplerate * block_seconds), dtype='float32', always_2d=True):
+            x = block.mean(axis=1)
+            if resampler is not None:
+                x = resampler.process(x)
+            x = np.concatenate([carry, x])
+            n = len(x) // frame_size * frame_size
+            carry = x[n:]
+
+            frames = x[:n].reshape(-1, frame_size)
+            voiced = frames[np.abs(frames).mean(axis=1) > vad_threshold].reshape(-1)
+            while len(voiced) > 0:
+                take = min(segment_size - filled, len(voiced))
+                segment[filled:filled + take] = voiced[:take]
+                filled += take
+                voiced = voiced[take:]
+                if filled == segment_size:
+                    yield segment.copy()
+                    filled = 0
+
+        if filled >= self.sampling_rate * min_segment_seconds:
+            yield segment[:filled].copy()
+
+
+    def extract_target_se(self, fpath, chunked=None):
+        """
+        Target embedding of a reference file. By default files up to
+        CHUNKED_SE_SECONDS are embedded in one pass, as the model does, and
+        only longer ones go through extract_se_chunked; `chunked` forces either.
+        """
+        if chunked is None:
+            chunked = sf.info(fpath).duration > CHUNKED_SE_SECONDS
+        if chunked:
+            return self.extract_se_chunked(fpath)[0]
+        with torch.no_grad():
+            return self.model.extract_se(self.get_spec(fpath=fpath))
+
+
+    def extract_se_chunked(self, fpath, segment_seconds=10.0, vad_threshold=0.01, n_threads=1, compare=False):
+        """
+        Speaker embedding of a (possibly very long) reference recording, computed
+        over VAD-filtered segments and aggregated as the frame-weighted mean of
+        the reference encoder's GRU states. At most `n_threads` segments are in
+        flight at once, which bounds peak memory.
+
+        Returns (target_se, report). With `compare` the report also holds the
+        cosine similarity and relative L2 distance to the single-shot embedding.
+        """
+        ref_enc = self.model.ref_enc
+
+        def encode(segment):
+            with torch.no_grad():
+                spec = self.get_spec(wav=segment)
+                return ref_enc.encode(spec.transpose(1, 2)), spec.size(-1)
+
+        total = None
+        frames = 0
+        segments = 0
+        in_flight = deque()
+
+        def collect(future):
+            nonlocal total, frames, segments
+            hidden, n = future.result()
+            total = hidden * n if total is None else total + hidden * n
+            frames += n
+            segments += 1
+
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            for segment in self.iter_speech_segments(fpath, segment_seconds, vad_threshold):
+                in_flight.append(executor.submit(encode, segment))
+                if len(in_flight) >= n_threads:
+                    collect(in_flight.popleft())
+            while in_flight:
+                collect(in_flight.popleft())
+
+        if segments == 0:
+            if vad_threshold > 0:
+                # Nothing passed the VAD (very quiet recording): use everything
+                return self.extract_se_chunked(fpath, segment_seconds, 0, n_threads, compare)
+            # Shorter than one segment: a single pass is cheap
+            with torch.no_grad():
+                target_se = self.model.extract_se(self.get_spec(fpath=fpath))
+            report = {'segments': 0, 'speech_seconds': sf.info(fpath).duration}
+            if compare:
+                report['cosine_similarity'] = 1.0
+                report['relative_l2'] = 0.0
+            return target_se, report
+
+        with torch.no_grad():
+            target_se = ref_enc.proj(total / frames).unsqueeze(-1)
+
+        report = {
+            'segments': segments,
+            'speech_seconds': frames * self.hps['data']['hop_length'] / self.sampling_rate,
+        }
+        if compare:
+            with torch.no_grad():
+                full_se = self.model.extract_se(self.get_spec(fpath=fpath))
+            report['cosine_similarity'] = F.cosine_similarity(target_se.flatten(), full_se.flatten(), dim=0).item()
+            report['relative_l2'] = ((target_se - full_se).norm() / full_se.norm()).item()
+        return target_se, report
+
+
+    def convert(self, src_spec, g_tgt, tau=1.0, source=None):
+        # `source`: precomputed source latents (z_p, y_mask), see LatentCache
+        with torch.no_grad():
+            audio = self.model(src_spec=src_spec, g_tgt=g_tgt, tau=tau, source=source).data.cpu().float().numpy()
+        return audio, self.sampling_rate
+
+
+    def convert_multi(self, src_spec, g_tgts, tau=1.0, source=None):
+        # `g_tgts` stacks N target embeddings ([N, 256, 1], see library.stack_se);
+        # returns audio as [N, samples]
         with torch.no_grad():
-            audio = self.model(src_spec=src_spec, g_tgt=g_tgt).data.cpu().float().numpy()
+            audio = self.model.forward_multi(src_spec, g_tgts, tau=tau, source=source).data.cpu().float().numpy()
         return audio, self.sampling_rate
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Flat, inference-ready checkpoint format.
+
+The file layout follows safetensors: an 8 byte little-endian header size, a
+JSON header mapping each tensor name to its dtype, shape and byte range, then
+the raw tensor data. Tensors are stored already dequantized and with weight
+norm folded, so loading is a memory map plus pointing each parameter at its
+slice of the mapping (no unpickling, no per-tensor Python math, no copies).
+
+    python -m vc.checkpoint vc/model.pth vc/model.safetensors
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+
+import torch
+from torch.nn.utils.weight_norm import WeightNorm
+
+
+FLAT_EXTENSION = '.safetensors'
+
+DTYPES = {
+    torch.float32: 'F32',
+    torch.float16: 'F16',
+    torch.bfloat16: 'BF16',
+    torch.int64: 'I64',
+    torch.int32: 'I32',
+    torch.int16: 'I16',
+    torch.int8: 'I8',
+    torch.uint8: 'U8',
+    torch.bool: 'BOOL',
+}
+DTYPE_NAMES = {name: dtype for dtype, name in DTYPES.items()}
+
+
+def is_flat_checkpoint(path):
+    return str(path).endswith(FLAT_EXTENSION)
+
+
+def find_flat_checkpoint(path):
+    # Prefer an up-to-date flat conversion sitting next to a .pth checkpoint
+    path = str(path)
+    if is_flat_checkpoint(path):
+        return path
+    flat_path = os.path.splitext(path)[0] + FLAT_EXTENSION
+    if os.path.exists(flat_path) and (not os.path.exists(path) or os.path.getmtime(flat_path) >= os.path.getmtime(path)):
+        return flat_path
+    return path
+
+
+def save_flat(state_dict, path, metadata=None):
+    header = {}
+    offset = 0
+    tensors = []
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu().contiguous()
+        nbytes = tensor.numel() * tensor.element_size()
+        header[name] = {
+            'dtype': DTYPES[tensor.dtype],
+            'shape': list(tensor.shape),
+            'data_offsets': [offset, offset + nbytes],
+        }
+        tensors.append(tensor)
+        offset += nbytes
+    if metadata:
+        header['__metadata__'] = {k: str(v) for k, v in metadata.items()}
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad the header so the data section starts 8 byte aligned
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for tensor in tensors:
+            if tensor.numel() > 0:
+                f.write(tensor.view(-1).view(torch.uint8).numpy().tobytes())
+
+
+def load_flat(path):
+    """
+    Returns a state dict whose tensors are views into a private (copy-on-write)
+    memory map of the file. Pages are shared with the page cache, so several
+    processes loading the same file don't each hold a copy of the weights.
+    """
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    state_dict = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = DTYPE_NAMES[info['dtype']]
+        begin, end = info['data_offsets']
+        if end == begin:
+            tensor = torch.empty(info['shape'], dtype=dtype)
+        else:
+            itemsize = torch.empty((), dtype=dtype).element_size()
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=(end - begin) // itemsize, offset=data_start + begin)
+        state_dict[name] = tensor.view(info['shape'])
+    return state_dict
+
+
+def strip_weight_norm(model):
+    """
+    Drops the weight norm reparametrization without folding it, leaving a
+    plain `weight` parameter of the right shape for load_state_dict(assign=True)
+    to replace. Only useful before loading a flat checkpoint.
+    """
+    for module in model.modules():
+        for key, hook in list(module._forward_pre_hooks.items()):
+            if isinstance(hook, WeightNorm):
+                del module._forward_pre_hooks[key]
+                v = module._parameters.pop(hook.name + '_v')
+                del module._parameters[hook.name + '_g']
+                delattr(module, hook.name)
+                module.register_parameter(hook.name, v)
+    return model
+
+
+def convert_checkpoint(src_path, dst_path):
+    from vc import ToneColorConverter
+
+    converter = ToneColorConverter(ckpt_path=src_path, device='cpu', prefer_flat=False)
+    converter.model.remove_weight_norm()
+    save_flat(converter.model.state_dict(), dst_path, metadata={'format': 'lilac-flat', 'source': src_path})
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python -m vc.checkpoint <model.pth> <model.safetensors>")
+        sys.exit(1)
+    convert_checkpoint(sys.argv[1], sys.argv[2])
+    print(f"Wrote {sys.argv[2]}")
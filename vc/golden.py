@@ -0,0 +1,223 @@
+"""
+Golden-output checks for inference optimizations.
+
+`generate` runs the reference eager model on a fixed set of fixture inputs
+and stores every stage (spectrogram, source embedding, posterior latent,
+flow outputs, decoder audio). `compare` runs a registered backend on the
+same inputs and reports per-stage SNR, max and relative error against the
+stored outputs. Posterior sampling is disabled (tau=0) by default; with
+tau > 0 the RNG is reseeded before every fixture instead.
+
+    python -m vc.golden generate --model vc/model.pth --out golden.pt
+    python -m vc.golden compare --model vc/model.pth --golden golden.pt --backend eager
+
+`--random-weights SEED` runs both on a seeded, randomly initialized model
+instead of a checkpoint.
+"""
+import argparse
+import copy
+import os
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+from vc import ToneColorConverter
+from vc.checkpoint import save_flat
+from vc.metrics import stage_metrics
+
+STAGES = ('spec', 'g_src', 'z', 'z_p', 'z_hat', 'audio')
+
+# Minimum SNR in dB per stage. The registered backends are exact rewrites
+# and differ from eager by float32 rounding only (about 130 dB on audio);
+# lossy paths need a looser --tolerance
+DEFAULT_TOLERANCES = {stage: 100.0 for stage in STAGES}
+
+BACKENDS = {}
+
+
+def register_backend(name):
+    """
+    Registers `prepare(converter) -> converter` under `name`. The returned
+    converter (the same object or a modified copy) is run through the same
+    staged forward as the reference.
+    """
+    def register(prepare):
+        BACKENDS[name] = prepare
+        return prepare
+    return register
+
+
+@register_backend('eager')
+def _eager(converter):
+    return converter
+
+
+@register_backend('fused-resblocks')
+def _fused_resblocks(converter):
+    converter = copy.deepcopy(converter)
+    converter.model.dec.fuse_resblocks()
+    return converter
+
+
+@register_backend('polyphase')
+def _polyphase(converter):
+    converter = copy.deepcopy(converter)
+    converter.model.dec.polyphase_upsampling()
+    return converter
+
+
+@register_backend('flat-checkpoint')
+def _flat_checkpoint(converter):
+    # Round trip through the flat format: weight norm folded, memory mapped
+    model = copy.deepcopy(converter.model)
+    model.remove_weight_norm()
+    fd, path = tempfile.mkstemp(suffix='.safetensors')
+    os.close(fd)
+    try:
+        save_flat(model.state_dict(), path)
+        return ToneColorConverter(ckpt_path=path, device=converter.device)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # still mapped (Windows)
+
+
+def random_converter(seed=0, device='cpu'):
+    """
+    Converter with seeded random weights, so the checks run without a
+    checkpoint. Parameters initialized to zero (the flow's output convs)
+    get small random values too, otherwise those stages would be identities.
+    """
+    torch.manual_seed(seed)
+    converter = ToneColorConverter(ckpt_path=None, device=device)
+    with torch.no_grad():
+        for param in converter.model.parameters():
+            if param.dim() > 1 and not param.any():
+                param.normal_(0.0, 0.01)
+    return converter
+
+
+def make_fixtures(samplerate=22050, chunk=9984, seed=1234):
+    """Synthetic, reproducible inputs: a realtime window of voiced, noisy and quiet audio, plus a long clip."""
+    rng = np.random.default_rng(seed)
+
+    def voiced(n, f0, vibrato=5.0):
+        t = np.arange(n) / samplerate
+        phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.03 * np.sin(2 * np.pi * vibrato * t))) / samplerate
+        x = sum(np.sin(k * phase) / k for k in range(1, 12))
+        envelope = 0.5 - 0.5 * np.cos(2 * np.pi * np.minimum(t / t[-1], 1.0))
+        return (0.25 * x * envelope).astype(np.float32)
+
+    window = 3 * chunk
+    return {
+        'voiced': voiced(window, 140.0),
+        'noisy': (voiced(window, 210.0) + 0.05 * rng.standard_normal(window)).astype(np.float32),
+        'quiet': (0.02 * voiced(window, 110.0)).astype(np.float32),
+        'long': voiced(5 * samplerate, 180.0, vibrato=3.0),
+        'target': voiced(4 * samplerate, 260.0, vibrato=6.0),
+    }
+
+
+def run_stages(converter, wav, target_se, tau=0.0, seed=0):
+    if tau > 0:
+        torch.manual_seed(seed)
+    stages = {}
+    with torch.no_grad():
+        stages['spec'] = converter.get_spec(wav=wav)
+        converter.model(src_spec=stages['spec'], g_tgt=target_se, tau=tau, stages=stages)
+    return {name: stages[name].detach().cpu().float() for name in STAGES}
+
+
+def generate(converter, tau=0.0, seed=0, quality=0):
+    converter.set_quality(quality)
+    fixtures = make_fixtures(converter.sampling_rate)
+    with torch.no_grad():
+        target_se = converter.model.extract_se(converter.get_spec(wav=fixtures.pop('target')))
+
+    golden = {
+        'meta': {'tau': tau, 'seed': seed, 'quality': quality, 'torch': torch.__version__},
+        'target_se': target_se.cpu(),
+        'fixtures': {},
+    }
+    for name, wav in fixtures.items():
+        golden['fixtures'][name] = {'wav': wav, 'stages': run_stages(converter, wav, target_se, tau, seed)}
+    return golden
+
+
+def compare(golden, converter, backend='eager', tolerances=None):
+    """
+    Returns (passed, results) with results[fixture][stage] holding the
+    metrics and a `passed` flag against `tolerances` (stage -> min SNR dB).
+    """
+    tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+    meta = golden['meta']
+    candidate = BACKENDS[backend](converter)
+    candidate.set_quality(meta['quality'])
+    target_se = golden['target_se'].to(converter.device)
+
+    passed = True
+    results = {}
+    for name, fixture in golden['fixtures'].items():
+        stages = run_stages(candidate, fixture['wav'], target_se, meta['tau'], meta['seed'])
+        results[name] = {}
+        for stage in STAGES:
+            metrics = stage_metrics(fixture['stages'][stage], stages[stage])
+            metrics['passed'] = metrics['snr_db'] >= tolerances[stage]
+            passed = passed and metrics['passed']
+            results[name][stage] = metrics
+    return passed, results
+
+
+def format_results(results):
+    lines = [f"{'fixture':<8} {'stage':<6} {'snr_db':>8} {'max_abs':>10} {'rel_l2':>10}"]
+    for name, stages in results.items():
+        for stage, m in stages.items():
+            flag = '' if m['passed'] else '  FAIL'
+            lines.append(f"{name:<8} {stage:<6} {m['snr_db']:>8.1f} {m['max_abs']:>10.2e} {m['rel_l2']:>10.2e}{flag}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-output checks for optimized inference paths")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help="Record reference outputs from the eager model")
+    gen.add_argument('--model', default='vc/model.pth')
+    gen.add_argument('--random-weights', type=int, metavar='SEED', help="Use a seeded random model instead of --model")
+    gen.add_argument('--out', default='golden.pt')
+    gen.add_argument('--tau', type=float, default=0.0, help="Posterior noise scale (0 = deterministic)")
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('--quality', type=int, default=0)
+
+    cmp = sub.add_parser('compare', help="Check a backend against recorded outputs")
+    cmp.add_argument('--model', default='vc/model.pth')
+    cmp.add_argument('--random-weights', type=int, metavar='SEED', help="Use a seeded random model instead of --model")
+    cmp.add_argument('--golden', default='golden.pt')
+    cmp.add_argument('--backend', default='eager', choices=sorted(BACKENDS))
+    cmp.add_argument('--tolerance', action='append', default=[], metavar='STAGE=DB', help="Override a stage's minimum SNR")
+    args = parser.parse_args()
+
+    if args.random_weights is not None:
+        converter = random_converter(args.random_weights)
+    else:
+        converter = ToneColorConverter(ckpt_path=args.model)
+    if args.command == 'generate':
+        torch.save(generate(converter, args.tau, args.seed, args.quality), args.out)
+        print(f"Wrote {args.out}")
+        return
+
+    tolerances = {}
+    for item in args.tolerance:
+        stage, value = item.split('=')
+        tolerances[stage] = float(value)
+    golden = torch.load(args.golden, weights_only=False)
+    passed, results = compare(golden, converter, args.backend, tolerances)
+    print(format_results(results))
+    print("PASS" if passed else "FAIL")
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
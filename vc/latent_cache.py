@@ -0,0 +1,140 @@
+from collections import deque
+
+import numpy as np
+import torch
+
+from vc.metrics import stage_metrics
+from vc.trace import span
+
+
+def wn_reach(wn):
+    # Frames of context a WN stack sees on either side
+    return sum((wn.kernel_size[0] - 1) // 2 * wn.dilation_rate ** i for i in range(wn.n_layers))
+
+
+def source_receptive_field(model):
+    # enc_q plus the active forward coupling layers, in spectrogram frames
+    # per side; the coupling layers' 1x1 convs add nothing
+    couplings = model.flow.flows[:2 * model.flow.n_active_flows:2]
+    return wn_reach(model.enc_q.enc) + sum(wn_reach(layer.enc) for layer in couplings)
+
+
+class LatentCache:
+    """
+    Streaming reuse of the source half of the model (enc_q and the forward
+    flow) across overlapping windows.
+
+    Windows that advance by whole spectrogram frames share most of their
+    frames. The posterior latents z and z_p of the previous window are kept;
+    the next window only runs the new frames plus `margin` frames on each
+    side: the left ones as context, which is dropped, and the right ones
+    to replace cached frames that were computed against the old window edge.
+
+    The result is approximate: only a margin of the full receptive field
+    (source_receptive_field, 64 frames per side) reproduces a recompute, and
+    a three-chunk window (117 frames) can't spare that, so every hit is a
+    full recompute. The default 16 frames trades accuracy for reuse. The
+    source embedding is also re-estimated on every window while cached
+    frames keep the one they were computed with. `validate` measures what
+    both cost by also running the full window and recording per-window
+    z / z_p error against it in `errors`.
+
+    Posterior noise is drawn once per frame and moves with the cache, so
+    cached and recomputed frames (and the validation reference) share it.
+    """
+    def __init__(self, model, hop_length, margin=16, validate=False):
+        if margin < 0:
+            raise ValueError(f"margin must be non-negative, got {margin}")
+        self.model = model
+        self.hop_length = hop_length
+        self.margin = margin
+        self.validate = validate
+
+        self.reused_frames = 0
+        self.computed_frames = 0
+        self.errors = deque(maxlen=1000)
+        self.reset()
+
+    def reset(self):
+        self.end = None
+        self.n_flows = None
+        self.noise = None
+        self.z = None
+        self.z_p = None
+
+    def _shift(self, n_frames, end):
+        # Frames the window advanced since the last call, or None when the
+        # cache can't be lined up with it
+        if self.z is None or self.z.size(-1) != n_frames or self.n_flows != self.model.flow.n_active_flows:
+            return None
+        advance = end - self.end
+        if advance <= 0 or advance % self.hop_length:
+            return None
+        shift = advance // self.hop_length
+        return shift if shift < n_frames else None
+
+    def _encode(self, spec, g_src, noise, tau):
+        model = self.model
+        lengths = torch.tensor([spec.size(-1)]).to(spec.device)
+        with span('enc_q'):
+            _, m, logs, mask = model.enc_q(spec, lengths, g=g_src if not model.zero_g else torch.zeros_like(g_src), tau=0)
+            z = (m + noise * tau * torch.exp(logs)) * mask
+        with span('flow'):
+            z_p = model.flow(z, mask, g=g_src)
+        return z, z_p, mask
+
+    @torch.no_grad()
+    def encode(self, src_spec, end, tau=1.0):
+        """
+        Source latents (z_p, y_mask) for the window `src_spec`, whose input
+        ends at absolute sample position `end`. Anything that breaks the
+        sequence (a gap, a quality tier change, reset()) falls back to a
+        full recompute.
+        """
+        model = self.model
+        n = src_spec.size(-1)
+        shift = self._shift(n, end)
+        with span('ref_enc'):
+            g_src = model.extract_se(src_spec)
+
+        fresh = torch.randn(1, model.enc_q.out_channels, n if shift is None else shift, device=src_spec.device)
+        noise = fresh if shift is None else torch.cat([self.noise[..., shift:], fresh], -1)
+
+        keep = 0 if shift is None else n - shift - self.margin
+        start = keep - self.margin
+        if start <= 0:
+            z, z_p, y_mask = self._encode(src_spec, g_src, noise, tau)
+            self.computed_frames += n
+        else:
+            z_new, z_p_new, _ = self._encode(src_spec[..., start:], g_src, noise[..., start:], tau)
+            z = torch.cat([self.z[..., shift:shift + keep], z_new[..., self.margin:]], -1)
+            z_p = torch.cat([self.z_p[..., shift:shift + keep], z_p_new[..., self.margin:]], -1)
+            y_mask = torch.ones(1, 1, n, dtype=z.dtype, device=z.device)
+            self.reused_frames += keep
+            self.computed_frames += n - start
+            if self.validate:
+                z_full, z_p_full, _ = self._encode(src_spec, g_src, noise, tau)
+                self.errors.append({
+                    'z_snr_db': stage_metrics(z_full, z)['snr_db'],
+                    'z_p_snr_db': stage_metrics(z_p_full, z_p)['snr_db'],
+                    'z_p_max_abs': (z_p_full - z_p).abs().max().item(),
+                })
+
+        self.end = end
+        self.n_flows = model.flow.n_active_flows
+        self.noise, self.z, self.z_p = noise, z, z_p
+        return z_p, y_mask
+
+    def stats(self):
+        total = self.reused_frames + self.computed_frames
+        stats = {
+            'margin': self.margin,
+            'reused_fraction': self.reused_frames / total if total else 0.0,
+        }
+        if self.errors:
+            for key in ('z_snr_db', 'z_p_snr_db'):
+                values = [e[key] for e in self.errors]
+                stats[f'min_{key}'] = float(np.min(values))
+                stats[f'median_{key}'] = float(np.median(values))
+            stats['z_p_max_abs'] = max(e['z_p_max_abs'] for e in self.errors)
+        return stats
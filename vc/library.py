@@ -0,0 +1,88 @@
+import os
+
+import torch
+
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg')
+CACHE_FILE = '.voices.pt'
+
+
+class VoiceLibrary:
+    """
+    Index of target voices in a directory with their speaker embeddings
+    precomputed, so switching voices never touches the reference audio.
+
+    voices/
+        alice.wav            -> voice "alice" (single clip)
+        bob/                 -> voice "bob", embedding averaged over clips
+            take1.wav
+            take2.wav
+
+    Embeddings are cached in voices/.voices.pt and only recomputed for voices
+    whose clips were added, removed or modified.
+    """
+    def __init__(self, converter, root):
+        self.converter = converter
+        self.root = root
+        self.cache_path = os.path.join(root, CACHE_FILE)
+        self.voices = {}
+
+        if os.path.exists(self.cache_path):
+            self.voices = torch.load(self.cache_path, map_location=converter.device)
+        self.refresh()
+
+    def _find_clips(self):
+        clips = {}
+        for entry in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, entry)
+            name, ext = os.path.splitext(entry)
+            if os.path.isdir(path):
+                files = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith(AUDIO_EXTENSIONS)]
+                if files:
+                    clips[entry] = files
+            elif ext.lower() in AUDIO_EXTENSIONS:
+                clips[name] = [path]
+        return clips
+
+    def refresh(self):
+        changed = False
+        found = self._find_clips()
+
+        for name in list(self.voices):
+            if name not in found:
+                del self.voices[name]
+                changed = True
+
+        for name, files in found.items():
+            stamps = {f: os.path.getmtime(f) for f in files}
+            if name in self.voices and self.voices[name]['clips'] == stamps:
+                continue
+            self.voices[name] = {'se': self.compute_se(files), 'clips': stamps}
+            changed = True
+
+        if changed:
+            torch.save(self.voices, self.cache_path)
+
+    def compute_se(self, files):
+        # Mean of the per-clip embeddings
+        ses = [self.converter.extract_target_se(f) for f in files]
+        return torch.stack(ses).mean(dim=0)
+
+    def names(self):
+        return list(self.voices)
+
+    def get(self, name):
+        return self.voices[name]['se']
+
+    def blend(self, name_a, name_b, alpha):
+        # alpha=0 -> name_a, alpha=1 -> name_b
+        return blend_se(self.get(name_a), self.get(name_b), alpha)
+
+
+def blend_se(se_a, se_b, alpha):
+    return (1.0 - alpha) * se_a + alpha * se_b
+
+
+def stack_se(*ses):
+    # Target embeddings as one [N, 256, 1] batch for multi-target conversion
+    return torch.cat([se.reshape(1, -1, 1) for se in ses])
@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def stage_metrics(reference, candidate):
+    # SNR, max and relative error of `candidate` against `reference` (tensors)
+    reference = reference.double()
+    candidate = candidate.double()
+    if reference.shape != candidate.shape:
+        return {'snr_db': float('-inf'), 'max_abs': float('inf'), 'rel_l2': float('inf'), 'shape': tuple(candidate.shape)}
+    error = candidate - reference
+    signal_power = reference.pow(2).sum().item()
+    error_power = error.pow(2).sum().item()
+    return {
+        'snr_db': float('inf') if error_power == 0 else 10 * np.log10(max(signal_power, 1e-30) / error_power),
+        'max_abs': error.abs().max().item(),
+        'rel_l2': (error_power / max(signal_power, 1e-30)) ** 0.5,
+    }
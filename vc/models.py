@@ -8,6 +8,7 @@ from vc import modules
 from torch.nn import Conv1d, ConvTranspose1d
 from torch.nn.utils import weight_norm, remove_weight_norm
 from vc.commons import init_weights
+from vc.trace import span
 
 
 class PosteriorEncoder(nn.Module):
@@ -65,6 +66,12 @@ class Generator(torch.nn.Module):
         super(Generator, self).__init__()
         self.num_kernels = len(resblock_kernel_sizes)
         self.num_upsamples = len(upsample_rates)
+        self.active_kernels = tuple(range(self.num_kernels))
+        self.kernel_sizes = tuple(resblock_kernel_sizes)
+        self.fuse_overhead = None
+        self.fused_cache = {}
+        self.fused_stages = None
+        self.polyphase_ups = None
         self.conv_pre = Conv1d(
             initial_channel, upsample_initial_channel, 7, 1, padding=3
         )
@@ -105,20 +112,79 @@ class Generator(torch.nn.Module):
 
         for i in range(self.num_upsamples):
             x = F.leaky_relu(x, modules.LRELU_SLOPE)
-            x = self.ups[i](x)
+            x = self.polyphase_ups[i](x) if self.polyphase_ups is not None else self.ups[i](x)
             xs = None
-            for j in range(self.num_kernels):
+            branches = self.fused_stages[i] if self.fused_stages is not None else \
+                [self.resblocks[i * self.num_kernels + j] for j in self.active_kernels]
+            for branch in branches:
                 if xs is None:
-                    xs = self.resblocks[i * self.num_kernels + j](x)
+                    xs = branch(x)
                 else:
-                    xs += self.resblocks[i * self.num_kernels + j](x)
-            x = xs / self.num_kernels
+                    xs += branch(x)
+            x = xs / len(self.active_kernels)
         x = F.leaky_relu(x)
         x = self.conv_post(x)
         x = torch.tanh(x)
 
         return x
 
+    def set_active_kernels(self, kernels=None):
+        # Subset of resblock branches averaged at each upsample stage (None = all)
+        if kernels is None:
+            kernels = range(self.num_kernels)
+        kernels = tuple(kernels)
+        assert len(kernels) > 0 and all(0 <= j < self.num_kernels for j in kernels)
+        self.active_kernels = kernels
+        if self.fuse_overhead is not None:
+            self.fused_stages = self._fused_stages(kernels)
+
+    def fuse_resblocks(self, max_overhead=0.6):
+        # Inference only (ResBlock1): run the parallel branches of each stage as
+        # stacked grouped convs. Branches are merged, smallest kernel first,
+        # while the zero taps added by padding stay within `max_overhead` of
+        # the real ones; whether fewer, larger convs pay off depends on the
+        # backend. None goes back to the per-branch modules. The fused convs
+        # copy the weights, so call this again after loading new ones.
+        self.fuse_overhead = max_overhead
+        self.fused_cache = {}
+        self.fused_stages = None
+        if max_overhead is not None:
+            self.fused_stages = self._fused_stages(self.active_kernels)
+
+    def _fused_stages(self, kernels):
+        if kernels not in self.fused_cache:
+            groups = []
+            for j in sorted(kernels, key=lambda j: self.kernel_sizes[j]):
+                group = groups[-1] + [j] if groups else None
+                if group is not None and \
+                        self.kernel_sizes[j] * len(group) <= (1 + self.fuse_overhead) * sum(self.kernel_sizes[g] for g in group):
+                    groups[-1] = group
+                else:
+                    groups.append([j])
+
+            stages = []
+            for i in range(self.num_upsamples):
+                blocks = [[self.resblocks[i * self.num_kernels + j] for j in group] for group in groups]
+                with torch.no_grad():
+                    stages.append([modules.FusedResBlock1(b) if len(b) > 1 else b[0] for b in blocks])
+            self.fused_cache[kernels] = stages
+        return self.fused_cache[kernels]
+
+    def polyphase_upsampling(self, layers=None):
+        # Inference only: run the transposed convs listed in `layers` (None =
+        # all, () = none) as modules.PolyphaseConvTranspose1d; same output up
+        # to rounding. upsample_benchmark.py shows which layers gain. The
+        # rewritten kernels are copies: rebuild after loading new weights.
+        if layers is None:
+            layers = range(self.num_upsamples)
+        layers = set(layers)
+        if not layers:
+            self.polyphase_ups = None
+            return
+        with torch.no_grad():
+            self.polyphase_ups = [modules.PolyphaseConvTranspose1d(layer) if i in layers else layer
+                                  for i, layer in enumerate(self.ups)]
+
     def remove_weight_norm(self):
         print("Removing weight norm...")
         for layer in self.ups:
@@ -166,6 +232,10 @@ class ReferenceEncoder(nn.Module):
             self.layernorm = None
 
     def forward(self, inputs, mask=None):
+        return self.proj(self.encode(inputs, mask))
+
+    def encode(self, inputs, mask=None):
+        # Final GRU state before the projection --- [N, 128]
         N = inputs.size(0)
 
         out = inputs.view(N, 1, -1, self.spec_channels)  # [N, 1, Ty, n_freqs]
@@ -185,7 +255,11 @@ class ReferenceEncoder(nn.Module):
         self.gru.flatten_parameters()
         memory, out = self.gru(out)  # out --- [1, N, 128]
 
-        return self.proj(out.squeeze(0))
+        return out.squeeze(0)
+
+    def remove_weight_norm(self):
+        for conv in self.convs:
+            remove_weight_norm(conv)
 
     def calculate_channels(self, L, kernel_size, stride, pad, n_convs):
         for i in range(n_convs):
@@ -209,6 +283,7 @@ class ResidualCouplingBlock(nn.Module):
         self.dilation_rate = dilation_rate
         self.n_layers = n_layers
         self.n_flows = n_flows
+        self.n_active_flows = n_flows
         self.gin_channels = gin_channels
 
         self.flows = nn.ModuleList()
@@ -216,15 +291,26 @@ class ResidualCouplingBlock(nn.Module):
             self.flows.append(modules.ResidualCouplingLayer(channels, hidden_channels, kernel_size, dilation_rate, n_layers, gin_channels=gin_channels, mean_only=True))
             self.flows.append(modules.Flip())
 
+    def set_active_flows(self, n_flows=None):
+        # Number of leading coupling layers (each paired with a Flip) to run in both directions
+        n_flows = self.n_flows if n_flows is None else n_flows
+        assert 1 <= n_flows <= self.n_flows
+        self.n_active_flows = n_flows
+
     def forward(self, x, x_mask, g=None, reverse=False):
+        flows = self.flows[:2 * self.n_active_flows]
         if not reverse:
-            for flow in self.flows:
+            for flow in flows:
                 x, _ = flow(x, x_mask, g=g, reverse=reverse)
         else:
-            for flow in reversed(self.flows):
+            for flow in reversed(flows):
                 x = flow(x, x_mask, g=g, reverse=reverse)
         return x
 
+    def remove_weight_norm(self):
+        for i in range(0, len(self.flows), 2):
+            self.flows[i].enc.remove_weight_norm()
+
 
 class SynthesizerTrn(nn.Module):
     """
@@ -287,15 +373,54 @@ class SynthesizerTrn(nn.Module):
         self.device = device
 
     
+    def remove_weight_norm(self):
+        # Fold weight norm into plain weights for inference
+        self.dec.remove_weight_norm()
+        self.enc_q.enc.remove_weight_norm()
+        self.flow.remove_weight_norm()
+        self.ref_enc.remove_weight_norm()
+
+
     def extract_se(self, spec):
         return self.ref_enc(spec.transpose(1, 2)).unsqueeze(-1).detach()
     
 
-    def forward(self, src_spec, g_tgt):
+    def encode_source(self, src_spec, tau=1.0, stages=None):
+        # The target-independent half: source embedding, posterior latent and
+        # the forward flow into the speaker-neutral prior space
         src_spec_lengths = torch.tensor([src_spec.size(-1)]).to(self.device)
-        g_src = self.extract_se(src_spec)
-        z, m_q, logs_q, y_mask = self.enc_q(src_spec, src_spec_lengths, g=g_src if not self.zero_g else torch.zeros_like(g_src), tau=1)
-        z_p = self.flow(z, y_mask, g=g_src)
-        z_hat = self.flow(z_p, y_mask, g=g_tgt, reverse=True)
-        o_hat = self.dec(z_hat * y_mask, g=g_tgt if not self.zero_g else torch.zeros_like(g_tgt))
-        return o_hat[0, 0]
\ No newline at end of file
+        with span('ref_enc'):
+            g_src = self.extract_se(src_spec)
+        with span('enc_q'):
+            z, m_q, logs_q, y_mask = self.enc_q(src_spec, src_spec_lengths, g=g_src if not self.zero_g else torch.zeros_like(g_src), tau=tau)
+        with span('flow'):
+            z_p = self.flow(z, y_mask, g=g_src)
+        if stages is not None:
+            stages.update(g_src=g_src, z=z, z_p=z_p)
+        return z_p, y_mask
+
+    def render(self, z_p, y_mask, g_tgt):
+        # Reverse flow and decoder for a batch of N target embeddings
+        # ([N, gin_channels, 1]) sharing one source latent; returns [N, 1, samples]
+        z_p = z_p.expand(g_tgt.size(0), -1, -1)
+        with span('flow_reverse'):
+            z_hat = self.flow(z_p, y_mask, g=g_tgt, reverse=True)
+        with span('dec'):
+            o_hat = self.dec(z_hat * y_mask, g=g_tgt if not self.zero_g else torch.zeros_like(g_tgt))
+        return z_hat, o_hat
+
+    def forward(self, src_spec, g_tgt, tau=1.0, stages=None, source=None):
+        # tau=0 drops the posterior sampling noise (deterministic output);
+        # a `stages` dict receives the intermediate tensors. `source` is a
+        # precomputed (z_p, y_mask), e.g. from a LatentCache
+        z_p, y_mask = source if source is not None else self.encode_source(src_spec, tau, stages)
+        z_hat, o_hat = self.render(z_p, y_mask, g_tgt)
+        if stages is not None:
+            stages.update(z_hat=z_hat, audio=o_hat[0, 0])
+        return o_hat[0, 0]
+
+    def forward_multi(self, src_spec, g_tgts, tau=1.0, source=None):
+        # One source, several target voices: the source half runs once, the
+        # rest as a batch. Returns [N, samples]
+        z_p, y_mask = source if source is not None else self.encode_source(src_spec, tau)
+        return self.render(z_p, y_mask, g_tgts)[1][:, 0]
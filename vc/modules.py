@@ -196,6 +196,91 @@ class ResBlock1(torch.nn.Module):
             remove_weight_norm(l)
 
 
+class FusedResBlock1:
+    """Sum of several ResBlock1 branches over one input, run as stacked grouped convs."""
+    def __init__(self, resblocks):
+        # Kernels are zero-padded (centred) to the largest one so the
+        # receptive fields line up. The first conv of every branch sees the
+        # same input and runs as one dense conv
+        self.n_branches = len(resblocks)
+        self.kernel_size = max(rb.convs1[0].kernel_size[0] for rb in resblocks)
+        self.layers = []
+        for j in range(len(resblocks[0].convs1)):
+            convs1 = [rb.convs1[j] for rb in resblocks]
+            dilation = convs1[0].dilation[0]
+            assert all(c.dilation[0] == dilation for c in convs1)
+            self.layers.append((
+                dilation,
+                _stack_convs(convs1, self.kernel_size),
+                _stack_convs([rb.convs2[j] for rb in resblocks], self.kernel_size),
+            ))
+
+    def __call__(self, x):
+        n = self.n_branches
+        xs = x.repeat(1, n, 1)
+        for j, (dilation, (w1, b1), (w2, b2)) in enumerate(self.layers):
+            xt = F.leaky_relu(x if j == 0 else xs, LRELU_SLOPE)
+            xt = F.conv1d(xt, w1, b1, padding=get_padding(self.kernel_size, dilation), dilation=dilation,
+                          groups=1 if j == 0 else n)
+            xt = F.leaky_relu(xt, LRELU_SLOPE)
+            xt = F.conv1d(xt, w2, b2, padding=get_padding(self.kernel_size, 1), groups=n)
+            xs = xt + xs
+        return xs.view(xs.size(0), n, -1, xs.size(2)).sum(1)
+
+
+class PolyphaseConvTranspose1d:
+    """A strided ConvTranspose1d run as one Conv1d per output phase plus an interleave."""
+    def __init__(self, conv):
+        # Output phase r only ever meets every s-th tap of the kernel, so no
+        # zero-stuffed input is materialized; the phase kernels are
+        # zero-padded to the input window they share
+        assert conv.groups == 1 and conv.dilation[0] == 1 and conv.output_padding[0] == 0
+        self.stride = conv.stride[0]
+        self.padding = conv.padding[0]
+        self.kernel_size = conv.kernel_size[0]
+        self.out_channels = conv.out_channels
+        # [in, out, k] -> [out, in, k]
+        weight = _conv_weight(conv).detach().transpose(0, 1)
+
+        # Output n = m*s + r is the sum over j of x[m + shift - j] * w[first + j*s]
+        phases = []
+        for r in range(self.stride):
+            c = r + self.padding
+            phases.append((c // self.stride, c % self.stride))
+        self.low = min(shift - len(range(first, self.kernel_size, self.stride)) + 1 for shift, first in phases)
+        self.high = max(shift for shift, first in phases)
+
+        self.weight = weight.new_zeros(self.stride * self.out_channels, weight.size(1), self.high - self.low + 1)
+        for r, (shift, first) in enumerate(phases):
+            for j, k in enumerate(range(first, self.kernel_size, self.stride)):
+                self.weight[r * self.out_channels:(r + 1) * self.out_channels, :, shift - j - self.low] = weight[:, :, k]
+        self.bias = conv.bias.detach().repeat(self.stride) if conv.bias is not None else None
+
+    def __call__(self, x):
+        n, _, length = x.shape
+        out_length = (length - 1) * self.stride - 2 * self.padding + self.kernel_size
+        n_out = -(-out_length // self.stride)
+        y = F.conv1d(F.pad(x, (-self.low, n_out + self.high - length)), self.weight, self.bias)
+        y = y.view(n, self.stride, self.out_channels, n_out).permute(0, 2, 3, 1)
+        return y.reshape(n, self.out_channels, n_out * self.stride)[:, :, :out_length]
+
+
+def _conv_weight(conv):
+    # Folded weight whether or not weight norm is still attached
+    if hasattr(conv, 'weight_v'):
+        v = conv.weight_v
+        return v * (conv.weight_g / v.norm(dim=tuple(range(1, v.dim())), keepdim=True))
+    return conv.weight
+
+
+def _stack_convs(convs, kernel_size):
+    weights = []
+    for conv in convs:
+        pad = (kernel_size - conv.kernel_size[0]) // 2
+        weights.append(F.pad(_conv_weight(conv).detach(), (pad, pad)))
+    return torch.cat(weights), torch.cat([conv.bias.detach() for conv in convs])
+
+
 class ResBlock2(torch.nn.Module):
     def __init__(self, channels, kernel_size=3, dilation=(1, 3)):
         super(ResBlock2, self).__init__()
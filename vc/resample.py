@@ -0,0 +1,85 @@
+from functools import lru_cache
+from math import ceil, gcd
+
+import numpy as np
+from torchaudio.transforms import Resample as AudioResample
+
+
+@lru_cache(maxsize=8)
+def get_resampler(orig_freq, new_freq):
+    # Building the sinc kernel dominates the cost of a one-off resample, so
+    # keep the transform around for every rate pair we've seen
+    return AudioResample(orig_freq=orig_freq, new_freq=new_freq)
+
+
+class StreamResampler:
+    """
+    Stateful polyphase resampler for block-wise audio at a rational rate ratio.
+
+    Blocks of any size can be fed in; the filter history and the fractional
+    output position carry over between calls, so the concatenated output is
+    the same as resampling the whole signal at once (delayed by half the
+    filter length). Each call is a single vectorized gather + multiply-add.
+    """
+    def __init__(self, orig_freq, new_freq, zeros=16, rolloff=0.945, beta=8.0):
+        g = gcd(int(orig_freq), int(new_freq))
+        self.up = int(new_freq) // g
+        self.down = int(orig_freq) // g
+
+        # Prototype low-pass at the upsampled rate, split into `up` phases of
+        # `taps` coefficients each
+        cutoff = min(1.0, self.up / self.down) * rolloff
+        self.taps = int(ceil(2 * zeros / cutoff))
+        length = self.taps * self.up
+        t = (np.arange(length) - (length - 1) / 2) / self.up
+        h = cutoff * np.sinc(cutoff * t) * np.kaiser(length, beta)
+        self.phases = h.reshape(self.taps, self.up).T.astype(np.float32)[:, ::-1].copy()
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.position = (self.taps - 1) * self.up
+
+    @property
+    def delay(self):
+        # Group delay in output samples
+        return (self.taps * self.up - 1) / 2 / self.down
+
+    def output_size(self, n):
+        # Number of samples the next process() call returns for n input samples
+        end = (len(self.history) + n) * self.up
+        return max(0, -(-(end - self.position) // self.down))
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        buffer = np.concatenate([self.history, x])
+
+        count = self.output_size(len(x))
+        m = self.position + self.down * np.arange(count)
+        base = m // self.up
+        window = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+        y = np.einsum('nk,nk->n', window[base - (self.taps - 1)], self.phases[m % self.up])
+
+        self.position += count * self.down - len(x) * self.up
+        self.history = buffer[len(buffer) - (self.taps - 1):]
+        return y.astype(np.float32, copy=False)
+
+
+class RevisableResampler(StreamResampler):
+    """
+    StreamResampler whose latest block can be replaced: revise() resamples
+    a corrected version of the block from the state before it, producing
+    the same number of output samples, and later blocks continue from the
+    corrected audio.
+    """
+    def reset(self):
+        super().reset()
+        self.saved = None
+
+    def process(self, x):
+        self.saved = (self.history, self.position)
+        return super().process(x)
+
+    def revise(self, x):
+        self.history, self.position = self.saved
+        return super().process(x)
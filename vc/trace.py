@@ -0,0 +1,132 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name_id')
+
+    def __init__(self, tracer, name_id):
+        self.tracer = tracer
+        self.name_id = name_id
+
+    def __enter__(self):
+        self.tracer._record(self.name_id, 0)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.name_id, 1)
+        return False
+
+
+class Tracer:
+    """
+    Begin/end events (name, thread, timestamp) in a preallocated ring, dumped
+    as Chrome trace-event JSON for Perfetto or chrome://tracing. When the ring
+    wraps, the oldest events are overwritten. Timestamps come from the
+    system-wide monotonic clock, so events from several processes line up.
+
+    While disabled, span() returns a shared no-op context manager, so
+    instrumented code pays one attribute check per span.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.capacity = 0
+        self.names = {}
+        self.name_list = []
+        self.thread_names = {}
+        self.lock = threading.Lock()
+
+    def enable(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.name_ids = np.zeros(capacity, dtype=np.int32)
+        self.phases = np.full(capacity, -1, dtype=np.int8)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.thread_ids = np.zeros(capacity, dtype=np.int64)
+        # next() on itertools.count is atomic under the GIL
+        self.counter = itertools.count()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _name_id(self, name):
+        name_id = self.names.get(name)
+        if name_id is None:
+            with self.lock:
+                name_id = self.names.setdefault(name, len(self.name_list))
+                if name_id == len(self.name_list):
+                    self.name_list.append(name)
+        return name_id
+
+    def _record(self, name_id, phase):
+        timestamp = time.perf_counter_ns()
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        slot = next(self.counter) % self.capacity
+        self.name_ids[slot] = name_id
+        self.phases[slot] = phase
+        self.timestamps[slot] = timestamp
+        self.thread_ids[slot] = tid
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, self._name_id(name))
+
+    def events(self):
+        """Recorded events, oldest first, as Chrome trace-event dicts."""
+        if self.capacity == 0:
+            return []
+        # Peeking at the counter claims one slot; unwritten slots keep phase -1
+        # and are skipped
+        count = next(self.counter)
+        if count <= self.capacity:
+            order = np.arange(count)
+        else:
+            order = np.arange(count - self.capacity, count) % self.capacity
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self.thread_names.items())
+        ]
+        for slot in order:
+            if self.phases[slot] < 0:
+                continue
+            events.append({
+                'name': self.name_list[self.name_ids[slot]],
+                'ph': 'BE'[self.phases[slot]],
+                'ts': int(self.timestamps[slot]) / 1000,
+                'pid': pid,
+                'tid': int(self.thread_ids[slot]),
+            })
+        return events
+
+    def dump(self, path, extra_events=()):
+        # `extra_events` are merged in, e.g. the events of a worker process
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events() + list(extra_events), 'displayTimeUnit': 'ms'}, f)
+
+
+# Process-wide tracer used by the realtime pipeline and the model
+tracer = Tracer()
+
+
+def span(name):
+    return tracer.span(name)
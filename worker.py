@@ -0,0 +1,384 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from vc.trace import span, tracer
+
+HEADER_SLOTS = 3  # write position, read position, dropped writes
+HEADER_BYTES = HEADER_SLOTS * 8
+
+
+class SharedRing:
+    """
+    Single-producer, single-consumer float32 ring buffer in shared memory.
+    Positions only ever grow; the producer writes samples before publishing
+    the new write position, the consumer reads before publishing its read
+    position, so neither side needs a lock.
+    """
+    def __init__(self, capacity=None, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + capacity * 4)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creating process unlinks the segment (spawned children
+            # share its resource tracker, so attaching doesn't register twice)
+            self.owner = False
+        self.header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((self.shm.size - HEADER_BYTES) // 4, dtype=np.float32, buffer=self.shm.buf, offset=HEADER_BYTES)
+        if self.owner:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def capacity(self):
+        return len(self.data)
+
+    @property
+    def fill(self):
+        return int(self.header[0] - self.header[1])
+
+    @property
+    def dropped(self):
+        return int(self.header[2])
+
+    @property
+    def written(self):
+        # Total samples ever written; positions in the stream are absolute
+        return int(self.header[0])
+
+    @property
+    def consumed(self):
+        return int(self.header[1])
+
+    def discard(self, n):
+        # Consumer side: skip up to n samples without copying them out
+        self.header[1] += max(0, min(n, self.fill))
+
+    def write(self, samples):
+        # All or nothing: a write that doesn't fit is counted and discarded
+        n = len(samples)
+        if n > self.capacity - self.fill:
+            self.header[2] += 1
+            return False
+        pos = int(self.header[0])
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.header[0] = pos + n
+        return True
+
+    def read(self, n):
+        n = min(n, self.fill)
+        out = np.empty(n, dtype=np.float32)
+        pos = int(self.header[1])
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.data[start:start + first]
+        out[first:] = self.data[:n - first]
+        self.header[1] = pos + n
+        return out
+
+    def close(self):
+        # Drop the numpy views first, SharedMemory refuses to close while exported
+        self.header = None
+        self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class InferenceProcess:
+    """
+    Runs ToneColorConverter and the ChunkProcessor in a child process. Input
+    chunks (model rate) and converted audio (device rate) travel through
+    SharedRings; the pipe only carries control messages (target swaps, stop)
+    and one small notice per converted chunk. In speculative mode a revision
+    of the previous chunk precedes the chunk in the output ring. The parent keeps the audio
+    callback and a pump thread that moves converted audio into the jitter
+    buffer, so inference never competes with them for the GIL.
+
+    Exposes the same counters as ChunkProcessor for get_stats(), plus the
+    child's `memory` (memory.memory_snapshot(), refreshed every few seconds).
+    """
+    def __init__(
+        self,
+        model_path,
+        target_se,
+        device='cpu',
+        chunk=9984,
+        hop=None,
+        output_rate=22050,
+        adaptive_quality=False,
+        max_pending_chunks=4,
+        output_seconds=5.0,
+        start_timeout=120,
+        trace=False,
+        speculative=False,
+        lookahead=None,
+        cache_margin=None,
+        align_splices=False,
+    ):
+        self.CHUNK = chunk
+        self.input_ring = SharedRing(chunk * max_pending_chunks)
+        self.output_ring = SharedRing(int(output_rate * output_seconds))
+
+        self.total_latency = 0
+        self.process_count = 0
+        self.process_times = deque(maxlen=1000)
+        self.last_was_speech = False
+        self.buffer_size = 0
+        self.quality = 0
+
+        self._target_se = target_se
+        self.send_lock = threading.Lock()
+        self.pump_thread = None
+        self.sink = None
+        self.on_step = None
+        self.trace_events = []
+        self.memory = None
+
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, model_path, device, _to_numpy(target_se), chunk, hop, output_rate, adaptive_quality,
+                  self.input_ring.name, self.output_ring.name, trace, speculative, lookahead, cache_margin, align_splices),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+        # Wait for the model to be loaded and warmed up
+        if not self.conn.poll(start_timeout):
+            self.close()
+            raise RuntimeError("Inference process did not start")
+        message = self.conn.recv()
+        if message[0] != 'ready':
+            self.close()
+            raise RuntimeError(f"Inference process failed: {message[1]}")
+
+    @property
+    def target_se(self):
+        return self._target_se
+
+    @target_se.setter
+    def target_se(self, target_se):
+        self._target_se = target_se
+        self._send(('target', _to_numpy(target_se)))
+
+    @property
+    def dropped(self):
+        return self.input_ring.dropped
+
+    def set_idle(self, idle, context=None):
+        # Idle: the worker finishes what is queued and then blocks on the pipe.
+        # Waking resets the window seeded with `context`; chunks pushed
+        # afterwards continue from there. This runs in the audio callback, so
+        # the context goes through the input ring and the pipe only carries
+        # where it starts. The marker goes first: the worker never reads ring
+        # input it saw arrive after its last look at the pipe.
+        if idle:
+            self._send(('idle',))
+            return
+        ring = self.input_ring
+        n = len(context) if context is not None and len(context) <= ring.capacity - ring.fill else 0
+        self._send(('wake', ring.written, n))
+        if n:
+            ring.write(context)
+
+    def prewarm(self):
+        # Speech is coming (see RealtimeVoiceConverter._push_input)
+        self._send(('prewarm',))
+
+    def push(self, chunk):
+        # Called from the audio callback: a memcpy into shared memory, no pipe I/O
+        return self.input_ring.write(chunk)
+
+    def start(self, sink, on_step=None):
+        # `sink(samples, revision)` receives converted audio on the pump thread
+        # (revision: see ChunkProcessor), then `on_step(process_time)` is
+        # called once the counters are updated
+        self.sink = sink
+        self.on_step = on_step
+        self.pump_thread = threading.Thread(target=self._pump, name='pump', daemon=True)
+        self.pump_thread.start()
+
+    def _pump(self):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == 'output':
+                _, revised, n, process_time, is_speech, buffer_size, quality = message
+                with span('pump'):
+                    revision = self.output_ring.read(revised) if revised else None
+                    self.sink(self.output_ring.read(n), revision)
+                self.total_latency += process_time
+                self.process_count += 1
+                self.process_times.append(process_time)
+                self.last_was_speech = is_speech
+                self.buffer_size = buffer_size
+                self.quality = quality
+                if self.on_step is not None:
+                    self.on_step(process_time)
+            elif message[0] == 'error':
+                print(f"Error in processing: \"{message[1]}\"")
+            elif message[0] == 'memory':
+                self.memory = message[1]
+            elif message[0] == 'trace':
+                self.trace_events = message[1]
+            elif message[0] == 'stopped':
+                break
+
+    def _send(self, message):
+        with self.send_lock:
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                pass
+
+    def close(self, timeout=5.0):
+        if self.process.is_alive():
+            self._send(('stop',))
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        if self.pump_thread is not None:
+            self.pump_thread.join(timeout)
+        self.conn.close()
+        self.input_ring.close()
+        self.output_ring.close()
+
+
+def _read_context(ring, n, timeout=1.0):
+    # The context follows its marker within microseconds (same callback)
+    deadline = time.monotonic() + timeout
+    while ring.fill < n and time.monotonic() < deadline:
+        time.sleep(0.0005)
+    return ring.read(n)
+
+
+def _to_numpy(target_se):
+    return target_se.detach().cpu().numpy() if hasattr(target_se, 'detach') else np.asarray(target_se)
+
+
+def _worker_main(
+    conn,
+    model_path,
+    device,
+    target_se,
+    chunk,
+    hop,
+    output_rate,
+    adaptive_quality,
+    input_name,
+    output_name,
+    trace=False,
+    speculative=False,
+    lookahead=None,
+    cache_margin=None,
+    align_splices=False,
+    poll_interval=0.005,
+    memory_interval=5.0,
+):
+    input_ring = SharedRing(name=input_name)
+    output_ring = SharedRing(name=output_name)
+    if trace:
+        tracer.enable()
+    try:
+        import torch
+        from core import ChunkProcessor
+        from vc import ToneColorConverter
+        from vc.resample import StreamResampler, RevisableResampler
+        from memory import memory_snapshot
+
+        converter = ToneColorConverter(ckpt_path=model_path, device=device)
+        converter.warmup()
+        processor = ChunkProcessor(converter, torch.from_numpy(target_se).to(device), chunk=chunk, adaptive_quality=adaptive_quality, hop=hop,
+                                   speculative=speculative, lookahead=lookahead, cache_margin=cache_margin, align_splices=align_splices)
+        step = hop if hop is not None else chunk
+        resampler_class = RevisableResampler if speculative else StreamResampler
+        resampler = resampler_class(processor.RATE, output_rate) if output_rate != processor.RATE else None
+    except Exception as e:
+        conn.send(('error', str(e)))
+        input_ring.close()
+        output_ring.close()
+        return
+    conn.send(('ready',))
+
+    last_dropped = 0
+    idle = False
+    last_memory = 0.0
+    while True:
+        # Wakes up immediately for control messages, otherwise checks the input
+        # ring; while idle it only waits on the pipe
+        if conn.poll(None if idle and input_ring.fill < step else poll_interval):
+            message = conn.recv()
+            if message[0] == 'stop':
+                break
+            if message[0] == 'target':
+                processor.target_se = torch.from_numpy(message[1]).to(device)
+            elif message[0] == 'idle':
+                idle = True
+            elif message[0] == 'prewarm' and idle:
+                converter.warmup(chunk)
+            elif message[0] == 'wake':
+                idle = False
+                _, start, n = message
+                # Input left over from before idling is stale once the window restarts
+                input_ring.discard(start - input_ring.consumed)
+                processor.reset(_read_context(input_ring, n) if n else None)
+
+        while True:
+            # Snapshot the fill before checking the pipe: a wake's context is
+            # written after its marker, so it can't be in the snapshot unless
+            # the marker is already waiting
+            if input_ring.fill < step or conn.poll():
+                break
+            try:
+                audio_chunk = input_ring.read(step)
+                dropped = input_ring.dropped != last_dropped
+                last_dropped = input_ring.dropped
+                with span('process_chunk'):
+                    output = processor.process(audio_chunk, input_ring.fill // step, dropped)
+                if output is None:
+                    continue
+                with span('output_write'):
+                    revision = processor.revision
+                    if resampler is not None:
+                        if revision is not None:
+                            revision = resampler.revise(revision)
+                        output = resampler.process(output)
+                    output = (output * 0.8).astype(np.float32)
+                    revised = 0
+                    if revision is not None:
+                        revised = len(revision)
+                        output = np.concatenate([(revision * 0.8).astype(np.float32), output])
+                    written = output_ring.write(output)
+                if not written:
+                    continue
+                conn.send(('output', revised, len(output) - revised, processor.process_times[-1], processor.last_was_speech,
+                           len(processor.chunk_buffer), converter.quality))
+            except Exception as e:
+                conn.send(('error', str(e)))
+
+        if time.monotonic() - last_memory >= memory_interval:
+            conn.send(('memory', memory_snapshot()))
+            last_memory = time.monotonic()
+
+    if trace:
+        conn.send(('trace', tracer.events()))
+    conn.send(('stopped',))
+    input_ring.close()
+    output_ring.close()